@@ -7,15 +7,19 @@ This file is covered by the GNU General Public License.
 Copyright (C) Javi Dominguez 2021
 """
 
+# Only what is needed to register the plugin is imported at NVDA startup.
+# The recognizer, the encoders, the writer and the rest of the modules are imported when first used.
+from .captureBackends import LazyBackend
 from .gui import *
 from .rectangleHandler import *
-from contentRecog import uwpOcr, RecogImageInfo
+from .settings import confspec, settings
+from collections import deque
 from datetime import datetime
 from functools import wraps
 from keyboardHandler import KeyboardInputGesture
-from subprocess import Popen
+from logHandler import log
 from threading import Event, Thread, Timer
-from time import sleep
+from time import perf_counter, sleep
 from tones import beep, nvwave
 import addonHandler
 import api
@@ -57,18 +61,13 @@ def evtMessage(msg):
 		pass
 	ui.message(msg)
 
-confspec = {
-	"folder":"string(default=/)",
-	"format":"string(default=BMP)",
-	"action":"integer(default=2)",
-	"step":"integer(default=5)",
-	"scale":"boolean(default=false)"
-}
 config.conf.spec["screenshots"]=confspec
 mouseCallbackFunc = None
 
 class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	scriptCategory = _("Screenshots Wizard")
+	# Captures larger than this number of pixels are saved in strips.
+	tiledCapturePixels = 3840*2160
 
 	def __init__(self, *args, **kwargs):
 		super(GlobalPlugin, self).__init__(*args, **kwargs)
@@ -92,10 +91,15 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 					for k in config.conf["screenshots"]:
 						config.conf.profiles[0]["screenshots"][k] = config.conf["screenshots"][k]
 				config.conf.profiles[0]["screenshots"]["folder"] = os.path.join(os.getenv("USERPROFILE"), "documents")
-		if "scale" not in config.conf.profiles[0]["screenshots"]:
-		# Required for those upgrading from previous versions.
-			config.conf.profiles[0]["screenshots"]["scale"] = config.conf["screenshots"]["scale"]
+		for key in confspec:
+			if key not in config.conf.profiles[0]["screenshots"]:
+			# Required for those upgrading from previous versions.
+				config.conf.profiles[0]["screenshots"][key] = config.conf["screenshots"][key]
 
+		# From now on the settings are read from this typed copy, which is refreshed when the configuration is saved, reset or switches profile.
+		settings.load()
+		for extensionPoint in (config.post_configSave, config.post_configReset, config.post_configProfileSwitch):
+			extensionPoint.register(settings.load)
 		NVDASettingsDialog.categoryClasses.append(ScreenshotsPanel)
 
 		self.oldGestureBindings = {}
@@ -105,20 +109,112 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = None
 		#14233
 		self.brailleMessageTimeout = config.conf["braille"]["showMessages"] if "showMessages" in config.conf["braille"] else config.conf["braille"]["noMessageTimeout"]
-		self.allowedBrailleGestures = set()
-		self.allowedNavigationGestures = set()
+		self.gestureFilter = GestureFilter()
+		config.post_configProfileSwitch.register(self.gestureFilter.invalidate)
+		self.oldCaptureFunc = None
+		# Scripts for the keys that are not in the layer, built once instead of for each key.
+		self.exitLayerScript = finally_(self.script_exit, self.finish)
+		self.wrongGestureScript = finally_(self.script_wrongGesture, lambda: None)
 		self.kbTimer = None
 		self.brTimer = None
-		self.flagNoAction = False
 		self.lastScreenshot = None
-		self.recognizer = uwpOcr.UwpOcr()
+		# Created on first use, see the properties of the same name.
+		self.__ocr = None
+		self.__sidecarOCR = None
+		self.__index = None
+		self.__writer = None
+		self.burst = None
+		self.watchedRectangle = None
+		self.screenCurtain = ScreenCurtainState()
+		self.instantShotLatencies = deque(maxlen=20)
 
 	def terminate(self):
+		if self.burst: self.burst.stop()
+		if self.watchedRectangle:
+			self.watchedRectangle.stopWatching()
+			self.watchedRectangle.unbind()
+		if self.__writer: self.__writer.stop()
+		if self.__index: self.__index.close()
+		# The backend is not created only to restore the pointer, and only the backends that hide it have a cursor suppressor.
+		backend = vars(Rectangle).get("backend")
+		if isinstance(backend, LazyBackend): backend = backend.instance
+		cursor = getattr(backend, "cursor", None)
+		if cursor: cursor.restoreNow()
+		config.post_configProfileSwitch.unregister(self.gestureFilter.invalidate)
+		for extensionPoint in (config.post_configSave, config.post_configReset, config.post_configProfileSwitch):
+			extensionPoint.unregister(settings.load)
 		try:
 			NVDASettingsDialog.categoryClasses.remove(ScreenshotsPanel)
 		except:
 			pass
 
+	@property
+	def ocr(self):
+		""" OCRService of the R command. Large rectangles are recognized in tiles, two at a time, each one by a new instance of the recognizer. """
+		if not self.__ocr:
+			from .ocr import OCRService
+			self.__ocr = OCRService(self.makeRecognizer(2), dispatch=wx.CallAfter, schedule=wx.CallAfter)
+		return self.__ocr
+
+	@property
+	def recognizer(self):
+		return self.ocr.engine
+
+	@property
+	def sidecarOCR(self):
+		""" The text files saved with the screenshots have their own recognizer, which answers them in turn in the background.
+		Each waiting screenshot keeps its pixels, so when too many are waiting the oldest one is indexed without its text. """
+		if not self.__sidecarOCR:
+			from .ocr import OCRService
+			self.__sidecarOCR = OCRService(self.makeRecognizer(1), supersede=False, schedule=wx.CallAfter, maxPending=2)
+		return self.__sidecarOCR
+
+	def makeRecognizer(self, concurrency):
+		from .ocr import TiledRecognizer
+		from contentRecog import uwpOcr, LinesWordsResult, RecogImageInfo
+		return TiledRecognizer(uwpOcr.UwpOcr, concurrency,
+		makeImageInfo=lambda l, t, w, h: RecogImageInfo(l, t, w, h, 1),
+		makeResult=LinesWordsResult, schedule=wx.CallAfter)
+
+	@property
+	def index(self):
+		if not self.__index:
+			from .searchIndex import ScreenshotIndex
+			self.__index = ScreenshotIndex(os.path.join(globalVars.appArgs.configPath, "screenshots.db"))
+		return self.__index
+
+	@property
+	def writer(self):
+		""" Background writer of the image files, started with the first screenshot. """
+		if not self.__writer:
+			from .writer import ImageWriter
+			self.__writer = ImageWriter(dispatch=wx.CallAfter)
+			self.__writer.start()
+		return self.__writer
+
+	def event_gainFocus(self, obj, nextHandler):
+		clipCache.invalidate()
+		if Rectangle.objectIndex: Rectangle.objectIndex.update(obj)
+		nextHandler()
+
+	def event_foreground(self, obj, nextHandler):
+		clipCache.invalidate()
+		if self.toggling: self.buildObjectIndex(obj)
+		nextHandler()
+
+	def event_locationChange(self, obj, nextHandler):
+		clipCache.invalidate()
+		if Rectangle.objectIndex: Rectangle.objectIndex.update(obj)
+		nextHandler()
+
+	def buildObjectIndex(self, window):
+		""" Indexes the visible objects of the window in the background, the rectangles will use it to find their reference objects. """
+		from .objectIndex import ObjectIndex
+		if Rectangle.objectIndex: Rectangle.objectIndex.cancel()
+		index = ObjectIndex()
+		Rectangle.objectIndex = index
+		Thread(target=index.build, args=(window,), daemon=True).start()
+
 	def mouseCapture(self, msg, x, y, injected):
 		if msg  == mouseHandler.WM_MOUSEMOVE:
 			return mouseCallbackFunc(msg, x, y, injected)
@@ -136,21 +232,13 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		mouseCallbackFunc = None
 
 	def getScript(self, gesture):
-		if not self.toggling:
-			return globalPluginHandler.GlobalPlugin.getScript(self, gesture)
-		if True in [gID.lower() in self.allowedBrailleGestures for gID in gesture.identifiers] \
-		or set(gesture.normalizedIdentifiers) & self.allowedNavigationGestures:
+		if not self.toggling or self.gestureFilter.isAllowed(gesture):
 			return globalPluginHandler.GlobalPlugin.getScript(self, gesture)
-		if isinstance(gesture, KeyboardInputGesture) and gesture.mainKeyName != "f1" and self.kbTimer:
+		if self.kbTimer and isinstance(gesture, KeyboardInputGesture) and gesture.mainKeyName != "f1":
 			self.kbTimer = None
 		script = globalPluginHandler.GlobalPlugin.getScript(self, gesture)
-		inputCore.manager._captureFunc = lambda self: not (gesture.isModifier and gesture.mainKeyName in (
-		"leftWindows", "rightWindows", "leftAlt"))
 		if not script:
-			if "kb:escape" in gesture.identifiers:
-				script = finally_(self.script_exit, self.finish)
-			else:
-				script = finally_(self.script_wrongGesture, lambda: None)
+			script = self.exitLayerScript if "kb:escape" in gesture.identifiers else self.wrongGestureScript
 		return script
 
 	def script_exit(self, gesture):
@@ -173,22 +261,19 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 				script.__self__.bindGesture(key, script.__name__[7:])
 		self.rectangle = Rectangle()
 		self.oldRectangles.clear()
+		if Rectangle.objectIndex: Rectangle.objectIndex.cancel()
+		Rectangle.objectIndex = None
 		self.unlockMouse()
+		if inputCore.manager._captureFunc is captureGesture:
+			inputCore.manager._captureFunc = self.oldCaptureFunc
+		self.oldCaptureFunc = None
 		self.lastGesture = None
 
 	def script_keyboardLayer(self, gesture):
 		if self.toggling:
 			self.script_wrongGesture(None)
 			return
-		try:
-			from visionEnhancementProviders.screenCurtain import ScreenCurtainProvider
-			screenCurtainId = ScreenCurtainProvider.getSettings().getId()
-			screenCurtainProviderInfo = vision.handler.getProviderInfo(screenCurtainId)
-			isScreenCurtainRunning = bool(vision.handler.getProviderInstance(screenCurtainProviderInfo))
-		except:
-			from screenCurtain import screenCurtain
-			isScreenCurtainRunning = screenCurtain is not None and screenCurtain.enabled
-		if isScreenCurtainRunning:
+		if self.screenCurtain.running:
 			# Translators: Reported when screen curtain is enabled.
 			ui.message(_("Please disable screen curtain before take a screenshot"))
 			return
@@ -206,31 +291,12 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 				else:
 					self.oldGestureBindings["kb:"+k] = script
 		self.bindGestures(self.__keyboardLayerGestures)
-		try:
-			gestures = inputCore.manager.getAllGestureMappings(obj=gui.mainFrame.prevFocus, ancestors=gui.mainFrame.prevFocusAncestors)
-		except:
-			gestures = None
-		try:
-		# Braille gestures that will be allowed:
-			for brGesture in\
-			gestures[globalCommands.SCRCAT_BRAILLE][globalCommands.GlobalCommands.script_braille_scrollForward.__doc__].gestures\
-			+ gestures[globalCommands.SCRCAT_BRAILLE][globalCommands.GlobalCommands.script_braille_scrollBack.__doc__].gestures:
-				self.allowedBrailleGestures.add(brGesture)
-		except:
-			pass
-		try:
-		# Object navigation gestures will be allowed
-			for x in gestures:
-				for y in gestures[x]:
-					gestureScriptInfo = gestures[x][y]
-					if gestureScriptInfo.className == "GlobalCommands" and (
-					gestureScriptInfo.scriptName.startswith("navigatorObject_") \
-					and not gestureScriptInfo.scriptName.endswith("devInfo")):
-						for g in gestureScriptInfo.gestures:
-							self.allowedNavigationGestures.add(g)
-		except:
-			pass
+		self.gestureFilter.update()
+		if inputCore.manager._captureFunc is not captureGesture:
+			self.oldCaptureFunc = inputCore.manager._captureFunc
+			inputCore.manager._captureFunc = captureGesture
 		self.toggling = True
+		self.buildObjectIndex(api.getForegroundObject())
 		self.lockMouse()
 		if "showMessages" in config.conf["braille"]:
 			#14233
@@ -250,10 +316,10 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 
 	def script_openFolder(self, gesture):
 		try:
-			os.startfile(config.conf.profiles[0]["screenshots"]["folder"])
+			os.startfile(settings.folder)
 		except FileNotFoundError:
 			Thread(target=wx.MessageBox, args=(
-			config.conf.profiles[0]["screenshots"]["folder"], _("Folder not found"), wx.ICON_EXCLAMATION)
+			settings.folder, _("Folder not found"), wx.ICON_EXCLAMATION)
 			).start()
 	# Translators: Message presented in input help mode.
 	script_openFolder.__doc__ = _("Open the folder where the screenshots are stored.")
@@ -287,21 +353,37 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	script_instantShotWindow.__doc__ = _("Take a  screenshot of current window directly, bypassing the keyboard command layer")
 
 	def instantShot(self, obj):
+		""" Saves a screenshot of obj straight away. The wizard is not opened, so there are no events to bind nor gestures to restore. """
+		start = perf_counter()
 		if self.toggling:
 			self.script_wrongGesture(None)
 			return
-		from visionEnhancementProviders.screenCurtain import ScreenCurtainProvider
-		screenCurtainId = ScreenCurtainProvider.getSettings().getId()
-		screenCurtainProviderInfo = vision.handler.getProviderInfo(screenCurtainId)
-		isScreenCurtainRunning = bool(vision.handler.getProviderInstance(screenCurtainProviderInfo))
-		if isScreenCurtainRunning:
+		if self.screenCurtain.running:
 			# Translators: Reported when screen curtain is enabled.
 			ui.message(_("Please disable screen curtain before take a screenshot"))
 			return
-		self.rectangleFromObject(obj, verbose=False)
-		self.flagNoAction = True
-		self.script_saveScreenshot(None)
-		self.flagNoAction = False
+		try:
+			shot = self.takeScreenshot(Rectangle().fromObject(obj))
+		except TypeError:
+			shot = None
+		if not shot:
+			# Translators: Message presented when the screen could not be captured.
+			ui.message(_("Could not capture the screen"))
+			return
+		try:
+			nvwave.playWaveFile(os.path.join(os.path.dirname(__file__), "soundEfects", "takeImage.wav"))
+		except:
+			pass
+		def onSaved(done):
+			if not done: return
+			self.instantShotLatencies.append(perf_counter()-start)
+			log.debug("Instant screenshot saved {:.0f} ms after the key press".format(self.instantShotLatencies[-1]*1000))
+		self.saveScreenshot(shot, os.path.join(settings.folder, self.makeFilename()), None, onSaved)
+
+	@property
+	def instantShotLatency(self):
+		""" Average seconds from the key press to the file written, of the last instant screenshots. """
+		return sum(self.instantShotLatencies)/len(self.instantShotLatencies) if self.instantShotLatencies else 0.0
 
 	def script_levelUp(self, gesture):
 		self.lastGesture = gesture.identifiers
@@ -360,53 +442,29 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 
 	def script_rectangleInfo(self, gesture):
 		self.lastGesture = None
-		messages = (
-		# 1
-		# Translators: Rectangle information: coordinates of the upper left and lower right corners.
-		_("from {startX}, {startY} to {endX}, {endY}").format(
-		startX=self.rectangle.topLeft.x, startY=self.rectangle.topLeft.y,
-		endX=self.rectangle.bottomRight.x, endY=self.rectangle.bottomRight.y),
-		# 2
-		# Translators: Rectangle information: Rectangle dimensions, width per height.
-		_("width {w} per height {h}").format(w=self.rectangle.width, h=self.rectangle.height),
-		# 3
-		# Translators: Rectangle information: Description of the reference object.
-		_("The reference object is {objectRole} {objectName}").format(
-		objectRole = controlTypes.role._roleLabels[self.rectangle.object.role],
-		objectName = self.rectangle.object.name if self.rectangle.object.name else ""),
-		# 4
-		# Translators: Rectangle information: Proportion of the rectangle occupied by the reference object.
-		_("{ratio}% of the rectangle is occupied by the object of reference").format(
-		ratio=round(self.rectangle.ratioObjectFrame(self.rectangle.object)*100)),
-		# 5
-		# Translators: Rectangle information: Relation of the object with respect to the rectangle.
-		"{msg}".format(
-		msg = _("The reference object is completely inside the rectangle") if self.rectangle.isObjectInsideRectangle() else _("Part of the reference object is outside the rectangle")),
-		# 6
-		# Translators: Rectangle information: Relation of the rectangle with respect to the active window.
-		"{msg}".format(
-		msg = _("The rectangle is inside the active window") if self.rectangle.isRectangleInsideTheWindow() else _("Part of the rectangle is outside the active window")),
-		# 7
-		# Translators: Rectangle Information: Relation of the rectangle with respect to the screen.
-		_("The rectangle occupies {percentage}% of the screen").format(
-		percentage = round(self.rectangle.ratioFrameObject(api.getDesktopObject())*100))
-		)
+		# Only the requested information is computed.
+		report = RectangleReport(self.rectangle)
 		try:
-			ui.message(messages[int(gesture.mainKeyName)-1])
-		except IndexError:
-			self.script_wrongGesture(None)
+			field = int(gesture.mainKeyName)
 		except:
-			ui.message(". ".join(messages))
+			field = None
+		if field is None:
+			ui.message(". ".join(report.getAll()))
+		elif 0 < field <= report.fieldCount:
+			ui.message(report.getField(field))
+		else:
+			self.script_wrongGesture(None)
 
 	def script_copyImageToClipboard(self, gesture=None):
+		# The screen is grabbed only once, the same capture is used to check and to build the bitmap.
+		capture = self.rectangle.capture()
 		# Translators: Message when there is no image to copy.
-		if not self.rectangle.getImage():
+		if not capture:
 			ui.message(_("No image to copy"))
 			return
 
-		# Retrieve the image of the rectangle and convert it to wx.Bitmap
-		img = self.rectangle.getImage()
-		bitmap = wx.Bitmap(img)
+		# Convert the captured image to wx.Bitmap
+		bitmap = wx.Bitmap(capture.getImage())
 
 		# Attempt to open the clipboard
 		if wx.TheClipboard.Open():
@@ -419,36 +477,34 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			ui.message(_("Unable to open the clipboard"))
 
 	def script_saveScreenshot(self, gesture):
-		img = self.rectangle.getImage()
-		if config.conf.profiles[0]["screenshots"]["scale"]:
-			img = self.scaleImage(img)
+		shot = self.takeScreenshot(self.rectangle)
+		if not shot:
+			self.finish()
+			# Translators: Message presented when the screen could not be captured.
+			ui.message(_("Could not capture the screen"))
+			return
 		try:
 			nvwave.playWaveFile(os.path.join(os.path.dirname(__file__), "soundEfects", "takeImage.wav"))
 		except:
 			pass
-		filename = _("screenshot_{timestamp}.{ext}").format(
-		timestamp=datetime.now().strftime("%d-%m-%Y_%H-%M-%S"),
-		ext=config.conf.profiles[0]["screenshots"]["format"])
+		filename = self.makeFilename()
+		action = settings.action
 		def callback(result):
 			if result == wx.ID_OK:
 				path = dlg.GetPath()
 			elif result == -1:
-				path = os.path.join(config.conf.profiles[0]["screenshots"]["folder"], filename)
+				path = os.path.join(settings.folder, filename)
 			else:
+				# A large area held by the backend is released.
+				if not shot[0]: shot[1].close()
 				wx.MessageBox(_("Image was not saved"), _("Cancelled"), wx.OK|wx.ICON_WARNING)
 				return
-			if img.SaveFile(path):
-				self.lastScreenshot = path
-			if self.flagNoAction: return
-			if int(config.conf.profiles[0]["screenshots"]["action"]) == 1:
-				os.startfile(path)
-			elif int(config.conf.profiles[0]["screenshots"]["action"]) == 2:
-				Popen("explorer /n, /select,\"{}\"".format(path))
+			self.saveScreenshot(shot, path, action)
 		if gesture and "shift" in gesture.modifierNames:
 			dlg = wx.FileDialog(
 			parent = gui.mainFrame,
 			message = _("Save image"),
-			defaultDir = config.conf.profiles[0]["screenshots"]["folder"],
+			defaultDir = settings.folder,
 			defaultFile = filename,
 			wildcard = "|*.bmp||*.jpg||*.gif||*.png||*.tiff",
 			style = wx.FD_SAVE)
@@ -458,6 +514,247 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			self.finish()
 			callback(-1)
 
+	def makeFilename(self):
+		return _("screenshot_{timestamp}.{ext}").format(
+		timestamp=datetime.now().strftime("%d-%m-%Y_%H-%M-%S"),
+		ext=settings.format)
+
+	def takeScreenshot(self, rectangle):
+		""" Captures the rectangle to save it. Returns a tuple (capture, image, transform, details) for saveScreenshot, or None if the screen could not be captured.
+		capture is None if the area is so large that it is held by the backend and read in strips while saving. """
+		from .encoders import TiledCapture, writers as encoderWriters
+		location = rectangle.location
+		transform = self.getSaveTransform(location.width, location.height)
+		if location.width*location.height > self.tiledCapturePixels and not transform\
+		and settings.format in encoderWriters:
+			# Very large areas are taken now and held by the backend, the background writer reads and encodes them in strips,
+			# so they are never whole in the memory of NVDA.
+			try:
+				img = TiledCapture(Rectangle.backend.hold(location), location, settings.format)
+			except Exception:
+				log.warning("Unable to capture {}".format(location), exc_info=True)
+				return None
+			capture = None
+		else:
+			# The capture is done right now, scaling, encoding and writing are left to the background writer.
+			capture = rectangle.capture()
+			if not capture: return None
+			img = capture.getImage()
+		obj = rectangle.object
+		try:
+			role, name = controlTypes.role._roleLabels[obj.role], obj.name or ""
+		except Exception:
+			role, name = "", ""
+		# The text is recognized after writing the image, from the same pixels if they are still available.
+		# They are kept only if the text is going to be recognized.
+		from .ocr import sidecarExtensions
+		recognize = capture and (settings.indexText or settings.sidecar in sidecarExtensions)
+		details = (capture.buffer if recognize else None, location, role, name)
+		return (capture, img, transform, details)
+
+	def saveScreenshot(self, shot, path, action, onSaved=None):
+		""" Hands a screenshot taken with takeScreenshot to the background writer, or links it to an identical one already saved.
+		onSaved, if given, is called with True or False when the file has been written. """
+		from .encoders import formatFromPath
+		from .searchIndex import contentKey
+		from .writer import SaveJob
+		capture, img, transform, details = shot
+		options = self.getEncoderOptions(path)
+		key = None
+		if capture:
+			# Identical pixels saved in the same way would give an identical file, which is linked instead of encoded again.
+			key = contentKey(capture.buffer, capture.width, capture.height,
+			formatFromPath(path, settings.format), sorted(options.items()),
+			self.getScaleFactor(capture.width, capture.height) if transform else 1, settings.scaleMethod)
+			duplicate = self.index.findContent(key)
+			if duplicate and self.saveDuplicate(duplicate, path, action, details):
+				if onSaved: onSaved(True)
+				return
+		def onDone(job, done):
+			self.onScreenshotSaved(job, done, action, details, key)
+			if onSaved: onSaved(done)
+		if not self.writer.submit(SaveJob(img, path, transform, onDone, options), timeout=0.5):
+			if not capture: img.close()
+			# Translators: Message presented when too many screenshots are waiting to be saved.
+			ui.message(_("Too many screenshots waiting to be saved, please wait"))
+
+	def script_burst(self, gesture):
+		if self.burst and self.burst.running:
+			self.script_wrongGesture(None)
+			return
+		from .burst import Burst
+		rectangle = self.rectangle
+		folder = settings.folder
+		timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+		ext = settings.format
+		# Translators: File name of each screenshot of a burst, followed by its number in the sequence.
+		makePath = lambda number: os.path.join(folder, _("screenshot_{timestamp}_{number}.{ext}").format(
+		timestamp=timestamp, number="{:03d}".format(number), ext=ext))
+		self.finish()
+		try:
+			nvwave.playWaveFile(os.path.join(os.path.dirname(__file__), "soundEfects", "takeImage.wav"))
+		except:
+			pass
+		self.burst = Burst(rectangle,
+		settings.burstCount,
+		settings.burstInterval/1000,
+		self.writer, makePath, self.getSaveTransform(rectangle.width, rectangle.height), self.onBurstFinished,
+		options=self.getEncoderOptions(makePath(1)))
+		self.burst.start()
+
+	def onBurstFinished(self, burst):
+		if burst.lastPath: self.lastScreenshot = burst.lastPath
+		# Translators: Message presented when a burst of screenshots has finished.
+		evtMessage(_("{written} screenshots saved at {fps} frames per second, {dropped} dropped").format(
+		written=burst.written, fps=round(burst.fps, 1), dropped=burst.dropped+burst.failed))
+
+	def script_watch(self, gesture):
+		if self.watchedRectangle:
+			watcher = self.watchedRectangle.watcher
+			self.watchedRectangle.stopWatching()
+			self.watchedRectangle.unbind()
+			self.watchedRectangle = None
+			self.finish()
+			# Translators: Message presented when the watch mode is stopped.
+			ui.message(_("Watch stopped, {changes} changes detected").format(changes=watcher.changes if watcher else 0))
+			return
+		rectangle = self.rectangle
+		self.finish()
+		rectangle.bind(EVT_pixelsChanged, wx.CallAfter, self.onPixelsChanged, rectangle)
+		rectangle.startWatching(settings.watchInterval/1000)
+		self.watchedRectangle = rectangle
+		# Translators: Message presented when the watch mode is started.
+		ui.message(_("Watching the rectangle, a screenshot will be saved each time its content changes"))
+
+	def onPixelsChanged(self, rectangle):
+		from .writer import SaveJob
+		if rectangle is not self.watchedRectangle: return
+		capture = rectangle.getChangedCapture()
+		if not capture: return
+		transform = self.getSaveTransform(capture.width, capture.height)
+		img = capture.getImage()
+		filename = _("screenshot_{timestamp}.{ext}").format(
+		timestamp=datetime.now().strftime("%d-%m-%Y_%H-%M-%S-%f")[:-3],
+		ext=settings.format)
+		path = os.path.join(settings.folder, filename)
+		job = SaveJob(img, path, transform, lambda job, done: self.onScreenshotSaved(job, done, None), self.getEncoderOptions(path))
+		if self.writer.submit(job):
+			try:
+				nvwave.playWaveFile(os.path.join(os.path.dirname(__file__), "soundEfects", "event.wav"))
+			except:
+				pass
+
+	def onScreenshotSaved(self, job, done, action, details=None, key=None):
+		""" Called in the main thread when the background writer has finished with a screenshot. """
+		if not done:
+			# Translators: Message presented when the image file could not be written.
+			evtMessage(_("Image could not be saved"))
+			return
+		self.lastScreenshot = job.path
+		if key: Thread(target=self.index.addContent, args=(key, job.path), daemon=True).start()
+		if details: self.indexScreenshot(job.path, *details)
+		if action == 1:
+			os.startfile(job.path)
+		elif action == 2:
+			from subprocess import Popen
+			Popen("explorer /n, /select,\"{}\"".format(job.path))
+
+	def saveDuplicate(self, original, path, action, details):
+		""" Saves a screenshot identical to the one already saved at original as a hard link to it.
+		Returns False if the link cannot be created, for example in another drive, and then the screenshot must be written as usual. """
+		if os.path.normcase(os.path.abspath(path)) == os.path.normcase(original):
+			# The file that would be written is already there.
+			details = None
+		else:
+			try:
+				if os.path.exists(path): os.remove(path)
+				os.link(original, path)
+			except OSError:
+				log.debugWarning("{} could not be linked to {}".format(path, original), exc_info=True)
+				return False
+		# Translators: Message presented when the screenshot is identical to one already saved, which is not saved again.
+		ui.message(_("Duplicate of {name}").format(name=os.path.basename(original)))
+		from .writer import SaveJob
+		self.onScreenshotSaved(SaveJob(None, path), True, action, details)
+		return True
+
+	def indexScreenshot(self, imagePath, pixels, location, objectRole, objectName):
+		""" Adds a screenshot already saved to the index of screenshots, with its text if it is recognized.
+		The text is recognized in the background and, if so configured, also written next to the image. """
+		from .ocr import resultText, sidecarExtensions, writeSidecar
+		from contentRecog import RecogImageInfo
+		kind = settings.sidecar
+		if kind not in sidecarExtensions: kind = None
+		indexText = settings.indexText
+		# Screenshots saved in strips were never whole in memory, and capturing them again would take the whole area in the main thread,
+		# so their text is not recognized. Neither is it when the pixels were not kept.
+		if (not kind and not indexText) or pixels is None:
+			Thread(target=self.index.add, args=(imagePath, location, objectRole, objectName), daemon=True).start()
+			return
+		l, t, w, h = location
+		try:
+			imgInfo = RecogImageInfo.createFromRecognizer(l, t, w, h, self.sidecarOCR.engine)
+		except Exception:
+			log.error("The text of {} could not be recognized".format(imagePath), exc_info=True)
+			Thread(target=self.index.add, args=(imagePath, location, objectRole, objectName), daemon=True).start()
+			return
+		def onResult(result):
+			# Delivered in the thread of the recognizer. None if the request was dropped because too many were waiting.
+			if isinstance(result, Exception):
+				log.error("The text of {} could not be recognized: {}".format(imagePath, result))
+				result = None
+			try:
+				if kind and result: writeSidecar(imagePath, kind, result, imgInfo, location, objectRole, objectName)
+			except Exception:
+				log.error("The text of {} could not be saved".format(imagePath), exc_info=True)
+			try:
+				self.index.add(imagePath, location, objectRole, objectName, resultText(result) if result and indexText else "")
+			except Exception:
+				log.error("{} could not be indexed".format(imagePath), exc_info=True)
+		self.sidecarOCR.recognize(pixels, imgInfo, location, onResult)
+
+	def script_searchScreenshots(self, gesture):
+		self.finish()
+		if not self.index.available:
+			# Translators: Message presented when the screenshots cannot be searched.
+			ui.message(_("Search is not available"))
+			return
+		dlg = wx.TextEntryDialog(gui.mainFrame,
+		# Translators: Prompt of the dialog to search the saved screenshots.
+		_("Text to search in the saved screenshots:"),
+		# Translators: Title of the dialog to search the saved screenshots.
+		_("Search screenshots"))
+		def callback(result):
+			if result != wx.ID_OK: return
+			query = dlg.GetValue()
+			hits = [hit for hit in self.index.search(query) if os.path.exists(hit[0])]
+			if not hits:
+				# Translators: Message presented when no saved screenshot contains the searched text.
+				wx.CallAfter(ui.message, _("No screenshots found"))
+				return
+			wx.CallAfter(self.chooseScreenshot, query, hits)
+		gui.runScriptModalDialog(dlg, callback)
+
+	def chooseScreenshot(self, query, hits):
+		""" Lets the user choose one of the screenshots found and opens it. """
+		choices = ["{name} {role}, {saved}: {text}".format(
+		name=name, role=role, saved=saved, text=" ".join(text.split())[:100]) for path, saved, rectangle, role, name, text in hits]
+		dlg = wx.SingleChoiceDialog(gui.mainFrame,
+		# Translators: Prompt of the dialog with the screenshots found.
+		_("{count} screenshots found").format(count=len(hits)),
+		# Translators: Title of the dialog with the screenshots found.
+		_("Search results for {query}").format(query=query), choices)
+		def callback(result):
+			if result != wx.ID_OK: return
+			path = hits[dlg.GetSelection()][0]
+			try:
+				os.startfile(path)
+			except OSError:
+				wx.CallAfter(wx.MessageBox, path, _("File not found"), wx.ICON_EXCLAMATION)
+			else:
+				self.lastScreenshot = path
+		gui.runScriptModalDialog(dlg, callback)
+
 	def script_increaseStep(self, gesture):
 		self.increaseOrDecreaseStep(1)
 		self.lastGesture = gesture.identifiers
@@ -467,7 +764,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_expandUpward(self, gesture):
-		p = self.rectangle.moveTopEdge(-1*int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveTopEdge(-1*settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the top edge has been moved.
@@ -478,7 +775,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_shrinkAbove(self, gesture):
-		p = self.rectangle.moveTopEdge(int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveTopEdge(settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the top edge has been moved.
@@ -489,7 +786,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_expandLeftward(self, gesture):
-		p = self.rectangle.moveLeftEdge(-1*int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveLeftEdge(-1*settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the left edge has been moved.
@@ -500,7 +797,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_shrinkLeft(self, gesture):
-		p = self.rectangle.moveLeftEdge(int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveLeftEdge(settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the left edge has been moved.
@@ -511,7 +808,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_expandBottomward(self, gesture):
-		p = self.rectangle.moveBottomEdge(int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveBottomEdge(settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the bottom edge has been moved.
@@ -522,7 +819,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_shrinkBottom(self, gesture):
-		p = self.rectangle.moveBottomEdge(-1*int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveBottomEdge(-1*settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the bottom edge has been moved.
@@ -533,7 +830,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_expandRightward(self, gesture):
-		p = self.rectangle.moveRightEdge(int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveRightEdge(settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the right edge has been moved.
@@ -544,7 +841,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_shrinkRight(self, gesture):
-		p = self.rectangle.moveRightEdge(-1*int(config.conf.profiles[0]["screenshots"]["step"]))
+		p = self.rectangle.moveRightEdge(-1*settings.step)
 		if p:
 			ui.message("{msg} {point}".format(
 			# Translators: Message informing that the right edge has been moved.
@@ -555,7 +852,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_expandRectangle(self, gesture):
-		if self.rectangle.expandOrShrink(int(config.conf.profiles[0]["screenshots"]["step"])):
+		if self.rectangle.expandOrShrink(settings.step):
 			# Translators: Message when the rectangle is expanded, dimensions width per height
 			ui.message(_("{msg} {width} per {height}").format(
 			msg = _("Expanding, ") if self.lastGesture != gesture.identifiers else "",
@@ -566,7 +863,7 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		self.lastGesture = gesture.identifiers
 
 	def script_shrinkRectangle(self, gesture):
-		if self.rectangle.expandOrShrink(-1*int(config.conf.profiles[0]["screenshots"]["step"])):
+		if self.rectangle.expandOrShrink(-1*settings.step):
 			# Translators: Message when the rectangle is shrunken, dimensions width per height
 			ui.message(_("{msg} {width} per {height}").format(
 			msg = _("Shrinking, ") if self.lastGesture != gesture.identifiers else "",
@@ -593,17 +890,23 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 
 	def script_OCR(self, gesture):
 		l, t, w, h = self.rectangle.location
-		self.recognizer._onResult = None
-		bm = self.rectangle.getRGBQUAD_Array()
-		imgInfo = RecogImageInfo.createFromRecognizer(l, t, w, h, self.recognizer)
+		obj = self.rectangle.object
 		def onResult(r):
-			ui.message(r.makeTextInfo(self.rectangle.object, "all").text)
+			if isinstance(r, Exception):
+				# Translators: Message when the text of the rectangle could not be recognized.
+				ui.message(_("could not be recognized."))
+			else:
+				ui.message(r.makeTextInfo(obj, "all").text)
+		from contentRecog import RecogImageInfo
+		capture = self.rectangle.capture()
 		try:
-			self.recognizer.recognize(bm, imgInfo, onResult)
-		except:
-			self.recognizer._onResult = None
-			ui.message(_("could not be recognized. {reason}").format(
-			reason = _("The image is too small.") if w<100 or h<100 else ""))
+			imgInfo = RecogImageInfo.createFromRecognizer(l, t, w, h, self.recognizer)
+			if not capture: raise RuntimeError("The screen could not be captured")
+		except Exception as inst:
+			onResult(inst)
+			return
+		# Identical captures are answered from the cache, and pressing again while recognizing replaces the previous request.
+		self.ocr.recognize(capture.buffer, imgInfo, self.rectangle.location, onResult)
 
 	def script_help(self, gesture):
 		if self.kbTimer and self.kbTimer.is_alive():
@@ -656,22 +959,44 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 			ui.message(_("object not found"))
 
 	def increaseOrDecreaseStep(self, x):
-		step = int(config.conf.profiles[0]["screenshots"]["step"])
+		step = settings.step
 		step = step+x
 		if step < 11 and step > 0:
-			config.conf.profiles[0]["screenshots"]["step"] = step
+			settings.set("step", step)
 			# Translators: Message   when modifying the amount of movement in pixels
 			# Translators: Message presented when the number of pixels per movement is modified.
-			ui.message(_("{step} px").format(step=config.conf.profiles[0]["screenshots"]["step"]))
+			ui.message(_("{step} px").format(step=settings.step))
 		else:
 			self.script_wrongGesture(None)
 
-	def scaleImage(self, img):
+	def getScaleFactor(self, width, height):
+		""" Integer factor by which an image of the given size will be enlarged. """
 		fg = api.getDesktopObject()
-		wFactor = round(fg.location.width/img.Width)
-		hFactor = round(fg.location.height/img.Height)
+		wFactor = round(fg.location.width/width)
+		hFactor = round(fg.location.height/height)
 		factor = wFactor if wFactor<hFactor else hFactor
 		if factor>4: factor = 4 # Enlarging more than 4x produces blurry images.
+		return factor
+
+	def getEncoderOptions(self, path):
+		""" Options of the encoder for the format of the file, according to the settings. """
+		from .encoders import formatFromPath, getEncoderOptions
+		return getEncoderOptions(formatFromPath(path, settings.format), settings)
+
+	def getSaveTransform(self, width, height):
+		""" Returns the function that will be applied to the image before saving it, or None. """
+		if not settings.scale: return None
+		factor = self.getScaleFactor(width, height)
+		if factor <= 1: return None
+		return lambda image: self.scaleImage(image, factor)
+
+	def scaleImage(self, img, factor=None):
+		# Factor can be calculated in advance, so that this can run in the writer thread without accessing NVDA objects.
+		if factor is None: factor = self.getScaleFactor(img.Width, img.Height)
+		if settings.scaleMethod == "nearest" and not img.HasAlpha():
+			# Repeating the pixels is faster and keeps the text sharp.
+			from .imageOps import scaleNearest
+			return wx.ImageFromBuffer(img.Width*factor, img.Height*factor, scaleNearest(img.GetData(), img.Width, img.Height, factor))
 		return img.Scale(img.Width*factor, img.Height*factor, wx.IMAGE_QUALITY_HIGH)
 
 	__gestures = {
@@ -697,6 +1022,8 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	"kb:6": "rectangleInfo",
 	"kb:7": "rectangleInfo",
 	"kb:c": "copyImageToClipboard",
+	"kb:b": "burst",
+	"kb:shift+w": "watch",
 	"kb:enter": "saveScreenshot",
 	"kb:shift+enter": "saveScreenshot",
 	"kb:numpadEnter": "saveScreenshot",
@@ -712,7 +1039,8 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	"kb:control+shift+downArrow": "shrinkRectangle",
 	"kb:backspace": "adjustToObject",
 	"kb:F1": "help",
-	"kb:r": "OCR"
+	"kb:r": "OCR",
+	"kb:control+f": "searchScreenshots"
 	}
 
 class Stack:
@@ -735,3 +1063,187 @@ class Stack:
 	def clear(self):
 		self.items = []
 		return self.isEmpty()
+
+class RectangleReport():
+	""" Information about a rectangle, presented by script_rectangleInfo.
+	Each field is computed only when requested. The desktop and foreground objects are looked up once per report,
+	and the walk through the containers of the reference object is shared through the clipping cache of rectangleHandler. """
+
+	def __init__(self, rectangle):
+		self.rectangle = rectangle
+		self.__desktop = None
+		self.__foreground = None
+		self.__fields = (
+		self.corners,
+		self.dimensions,
+		self.referenceObject,
+		self.objectRatio,
+		self.objectInside,
+		self.insideWindow,
+		self.screenRatio)
+
+	@property
+	def fieldCount(self):
+		return len(self.__fields)
+
+	@property
+	def desktop(self):
+		if not self.__desktop: self.__desktop = api.getDesktopObject()
+		return self.__desktop
+
+	@property
+	def foreground(self):
+		if not self.__foreground: self.__foreground = api.getForegroundObject()
+		return self.__foreground
+
+	def getField(self, number):
+		""" Returns the message of the field, numbered from 1 as the keys of the wizard. """
+		if number < 1: raise IndexError(number)
+		return self.__fields[number-1]()
+
+	def getAll(self):
+		return [field() for field in self.__fields]
+
+	def corners(self):
+		# 1
+		# Translators: Rectangle information: coordinates of the upper left and lower right corners.
+		return _("from {startX}, {startY} to {endX}, {endY}").format(
+		startX=self.rectangle.topLeft.x, startY=self.rectangle.topLeft.y,
+		endX=self.rectangle.bottomRight.x, endY=self.rectangle.bottomRight.y)
+
+	def dimensions(self):
+		# 2
+		# Translators: Rectangle information: Rectangle dimensions, width per height.
+		return _("width {w} per height {h}").format(w=self.rectangle.width, h=self.rectangle.height)
+
+	def referenceObject(self):
+		# 3
+		# Translators: Rectangle information: Description of the reference object.
+		return _("The reference object is {objectRole} {objectName}").format(
+		objectRole = controlTypes.role._roleLabels[self.rectangle.object.role],
+		objectName = self.rectangle.object.name if self.rectangle.object.name else "")
+
+	def objectRatio(self):
+		# 4
+		# Translators: Rectangle information: Proportion of the rectangle occupied by the reference object.
+		return _("{ratio}% of the rectangle is occupied by the object of reference").format(
+		ratio=round(self.rectangle.ratioObjectFrame(self.rectangle.object)*100))
+
+	def objectInside(self):
+		# 5
+		# Translators: Rectangle information: Relation of the object with respect to the rectangle.
+		return "{msg}".format(
+		msg = _("The reference object is completely inside the rectangle") if self.rectangle.isObjectInsideRectangle() else _("Part of the reference object is outside the rectangle"))
+
+	def insideWindow(self):
+		# 6
+		# Translators: Rectangle information: Relation of the rectangle with respect to the active window.
+		return "{msg}".format(
+		msg = _("The rectangle is inside the active window") if self.rectangle.isRectangleInsideTheWindow(self.foreground) else _("Part of the rectangle is outside the active window"))
+
+	def screenRatio(self):
+		# 7
+		# Translators: Rectangle Information: Relation of the rectangle with respect to the screen.
+		return _("The rectangle occupies {percentage}% of the screen").format(
+		percentage = round(self.rectangle.ratioFrameObject(self.desktop)*100))
+
+def captureGesture(gesture):
+	""" Capture function of the input manager while the layer is active. The Windows and Alt keys alone are not passed to the system. """
+	return not (gesture.isModifier and gesture.mainKeyName in ("leftWindows", "rightWindows", "leftAlt"))
+
+class GestureFilter():
+	""" Gestures of NVDA that keep working while the layer is active: braille scrolling and object navigation.
+	They are looked up in all the gesture maps only when needed, the first time and after the configuration profile, the braille display, the user gestures
+	or the application of the focus have changed.
+	allowed is a frozenset of normalized identifiers, so checking a key is a lookup per identifier of the gesture. """
+
+	def __init__(self):
+		self.allowed = frozenset()
+		self.builds = 0
+		self.__key = None
+
+	def invalidate(self, *args, **kwargs):
+		self.__key = None
+
+	def update(self):
+		key = self.__fingerprint()
+		if key == self.__key: return
+		self.allowed = frozenset(identifier.lower() for identifier in self.__collect())
+		self.__key = key
+		self.builds += 1
+
+	def isAllowed(self, gesture):
+		allowed = self.allowed
+		for identifier in gesture.normalizedIdentifiers:
+			if identifier in allowed: return True
+		return False
+
+	def __fingerprint(self):
+		try:
+			display = braille.handler.display.name
+		except:
+			display = None
+		try:
+			# The file of the user gestures is written each time they are edited.
+			userGestures = os.path.getmtime(inputCore.manager.userGestureMap.fileName)
+		except:
+			userGestures = None
+		try:
+			# The gestures are looked up for the focus, whose application may override some of them.
+			appName = gui.mainFrame.prevFocus.appModule.appName
+		except:
+			appName = None
+		return (display, userGestures, appName)
+
+	def __collect(self):
+		identifiers = []
+		try:
+			gestures = inputCore.manager.getAllGestureMappings(obj=gui.mainFrame.prevFocus, ancestors=gui.mainFrame.prevFocusAncestors)
+		except:
+			return identifiers
+		try:
+		# Braille gestures that will be allowed:
+			identifiers.extend(gestures[globalCommands.SCRCAT_BRAILLE][globalCommands.GlobalCommands.script_braille_scrollForward.__doc__].gestures\
+			+ gestures[globalCommands.SCRCAT_BRAILLE][globalCommands.GlobalCommands.script_braille_scrollBack.__doc__].gestures)
+		except:
+			pass
+		try:
+		# Object navigation gestures will be allowed
+			for x in gestures:
+				for y in gestures[x]:
+					gestureScriptInfo = gestures[x][y]
+					if gestureScriptInfo.className == "GlobalCommands" and (
+					gestureScriptInfo.scriptName.startswith("navigatorObject_") \
+					and not gestureScriptInfo.scriptName.endswith("devInfo")):
+						identifiers.extend(gestureScriptInfo.gestures)
+		except:
+			pass
+		return identifiers
+
+class ScreenCurtainState():
+	""" Tells whether the screen curtain is on. The provider of the screen curtain is looked up only once,
+	afterwards checking it is a lookup in the table of running providers of the vision handler. """
+
+	def __init__(self):
+		self.__isRunning = None
+
+	@property
+	def running(self):
+		if not self.__isRunning:
+			self.__isRunning = self.__resolve()
+		try:
+			return self.__isRunning()
+		except Exception:
+			# The provider may have been unregistered, it will be looked up again.
+			self.__isRunning = None
+			return False
+
+	def __resolve(self):
+		try:
+			from visionEnhancementProviders.screenCurtain import ScreenCurtainProvider
+			providerInfo = vision.handler.getProviderInfo(ScreenCurtainProvider.getSettings().getId())
+			return lambda: bool(vision.handler.getProviderInstance(providerInfo))
+		except Exception:
+			# Newer versions of NVDA, where the screen curtain is no longer a vision provider.
+			import screenCurtain
+			return lambda: screenCurtain.screenCurtain is not None and screenCurtain.screenCurtain.enabled
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Burst capture for the screenshots wizard NVDA addon.
+Takes a numbered sequence of screenshots of a rectangle at a fixed interval.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from .rectangleHandler import Capture
+from .writer import SaveJob
+from time import perf_counter
+
+class Burst():
+	""" Takes count captures of a rectangle, one every interval seconds or as fast as possible if interval is 0.
+	The captures are done in the main thread, scheduled with wx.CallLater, and share the buffers of a capture session.
+	Only a copy of the raw pixels is taken in the main thread, they are converted to an image in the writer thread.
+	Each frame is handed to the background writer; if the writer is full or a frame could not be taken in its time, it is dropped.
+	onFinish is called with the Burst object when all the frames have been written. """
+
+	def __init__(self, rectangle, count, interval, writer, makePath, transform=None, onFinish=None, callLater=None, options=None):
+		self.rectangle = rectangle
+		self.count = count
+		self.interval = interval
+		self.writer = writer
+		self.makePath = makePath
+		self.transform = transform
+		self.onFinish = onFinish
+		self.options = options
+		if not callLater:
+			import wx
+			callLater = wx.CallLater
+		self.__callLater = callLater
+		self.captured = 0
+		self.dropped = 0
+		self.written = 0
+		self.failed = 0
+		self.lastPath = None
+		self.running = False
+		self.__start = None
+		self.__end = None
+
+	def start(self):
+		self.running = True
+		self.rectangle.openSession()
+		self.__start = perf_counter()
+		self.__next()
+
+	def stop(self):
+		""" No more frames will be taken, the ones already queued will be written. """
+		self.dropped += self.count-self.taken
+		self.__endCapture()
+
+	@property
+	def taken(self):
+		""" Number of frames that have already been captured or dropped. """
+		return self.captured+self.dropped
+
+	@property
+	def fps(self):
+		""" Frames per second achieved while capturing. """
+		end = self.__end if self.__end else perf_counter()
+		if not self.__start or end <= self.__start: return 0.0
+		return self.captured/(end-self.__start)
+
+	def __next(self):
+		if not self.running: return
+		if self.interval:
+			# The slots whose time has already passed can no longer be captured.
+			slot = int((perf_counter()-self.__start)/self.interval)
+			if slot > self.taken:
+				self.dropped += min(slot, self.count)-self.taken
+		if self.taken >= self.count:
+			self.__endCapture()
+			return
+		number = self.taken+1
+		capture = self.rectangle.capture()
+		# The pixels must be copied now, the next capture will overwrite the buffer of the session.
+		frame = Capture(bytearray(memoryview(capture.buffer).cast("B")), capture.location) if capture else None
+		job = SaveJob(frame, self.makePath(number), self.__makeImage, self.__onWritten, self.options) if frame else None
+		if job and self.writer.submit(job):
+			self.captured += 1
+		else:
+			self.dropped += 1
+		if self.taken >= self.count:
+			self.__endCapture()
+			return
+		delay = self.__start+self.taken*self.interval-perf_counter() if self.interval else 0
+		self.__callLater(max(int(delay*1000), 0), self.__next)
+
+	def __makeImage(self, frame):
+		image = frame.getImage()
+		return self.transform(image) if self.transform else image
+
+	def __endCapture(self):
+		if not self.running: return
+		self.running = False
+		self.__end = perf_counter()
+		self.rectangle.closeSession()
+		self.__checkFinished()
+
+	def __onWritten(self, job, done):
+		if done:
+			self.written += 1
+			self.lastPath = job.path
+		else:
+			self.failed += 1
+		self.__checkFinished()
+
+	def __checkFinished(self):
+		if self.running or self.written+self.failed < self.captured: return
+		if self.onFinish:
+			onFinish, self.onFinish = self.onFinish, None
+			onFinish(self)
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Capture backends for the screenshots wizard NVDA addon.
+A backend is what actually takes the pixels of an area of the screen. Rectangle uses GDIBackend by default,
+SyntheticBackend works on an in-memory framebuffer so that the capture path can run without a Windows desktop.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from threading import Condition, Thread
+from time import perf_counter
+import ctypes
+import os
+
+SPI_SETMOUSECURSOR = 0x0057
+SPIF_SENDCHANGE = 0x02
+SRCCOPY = 0x00CC0020
+BI_RGB = 0
+DIB_RGB_COLORS = 0
+# Standard system cursors replaced while the pointer is hidden: arrow, I-beam, wait, cross, up arrow, the four sizing arrows, move, no, hand and app starting.
+SYSTEM_CURSORS = (32512, 32513, 32514, 32515, 32516, 32642, 32643, 32644, 32645, 32646, 32648, 32649, 32650)
+
+class RGBQUAD(ctypes.Structure):
+	""" Same layout as winGDI.RGBQUAD, one pixel in BGRA order. """
+	_fields_ = [
+	("rgbBlue", ctypes.c_ubyte),
+	("rgbGreen", ctypes.c_ubyte),
+	("rgbRed", ctypes.c_ubyte),
+	("rgbReserved", ctypes.c_ubyte)
+	]
+
+class BITMAPINFOHEADER(ctypes.Structure):
+	_fields_ = [
+	("biSize", ctypes.c_uint32),
+	("biWidth", ctypes.c_int32),
+	("biHeight", ctypes.c_int32),
+	("biPlanes", ctypes.c_uint16),
+	("biBitCount", ctypes.c_uint16),
+	("biCompression", ctypes.c_uint32),
+	("biSizeImage", ctypes.c_uint32),
+	("biXPelsPerMeter", ctypes.c_int32),
+	("biYPelsPerMeter", ctypes.c_int32),
+	("biClrUsed", ctypes.c_uint32),
+	("biClrImportant", ctypes.c_uint32)
+	]
+
+class CaptureBackend():
+	""" Base class for the capture backends.
+	Subclasses implement capture, which returns a ctypes array with width*height BGRA pixels, top-down, for a locationHelper.RectLTWH. """
+
+	name = None
+
+	def __init__(self):
+		self.captures = 0
+		self.allocations = 0
+		self.totalTime = 0.0
+		self.lastTime = 0.0
+
+	def capture(self, location):
+		raise NotImplementedError
+
+	def grab(self, location):
+		""" Captures the location and keeps count of the number of captures and the time spent on them. """
+		start = perf_counter()
+		try:
+			return self.capture(location)
+		finally:
+			# Without a session, every capture allocates its own buffers.
+			self.allocations += 1
+			self.record(start)
+
+	def record(self, start):
+		self.lastTime = perf_counter()-start
+		self.totalTime += self.lastTime
+		self.captures += 1
+
+	def openSession(self, holdCursor=True):
+		""" Returns a CaptureSession that keeps the buffers alive between captures of the same size.
+		With holdCursor the mouse pointer is hidden for the whole session, as a burst needs; otherwise only around each capture,
+		so that a session that lasts long, such as the one of watch mode, lets the pointer be restored between captures. """
+		return CaptureSession(self)
+
+	def hold(self, location):
+		""" Takes the location now and returns a frame that keeps it, to be read later in parts with its grab method and released with close. """
+		return HeldFrame(self.grab(location), location)
+
+	@property
+	def averageTime(self):
+		return self.totalTime/self.captures if self.captures else 0.0
+
+class LazyBackend():
+	""" Class attribute that creates its backend the first time it is read, so that nothing is set up until the first capture.
+	Assigning another backend to the class attribute replaces it, as before. """
+
+	def __init__(self, factory):
+		self.factory = factory
+		self.instance = None
+
+	def __get__(self, obj, owner=None):
+		if self.instance is None:
+			self.instance = self.factory()
+		return self.instance
+
+class CaptureSession():
+	""" Successive captures of the same size sharing the same buffers.
+	The buffers are allocated on the first capture and again only when the size changes.
+	The array returned by grab is overwritten by the next grab, it must be converted or copied before capturing again. """
+
+	def __init__(self, backend):
+		self.backend = backend
+		self.size = None
+		self.buffer = None
+
+	def grab(self, location):
+		size = (location.width, location.height)
+		if size != self.size:
+			self.close()
+			self.allocate(*size)
+			self.buffer = (RGBQUAD*(size[0]*size[1]))()
+			self.size = size
+			self.backend.allocations += 1
+		start = perf_counter()
+		try:
+			self.captureInto(location, self.buffer)
+		finally:
+			self.backend.record(start)
+		return self.buffer
+
+	def allocate(self, width, height):
+		pass
+
+	def free(self):
+		pass
+
+	def captureInto(self, location, buffer):
+		# Backends without their own session copy a normal capture into the shared buffer.
+		ctypes.memmove(buffer, self.backend.capture(location), ctypes.sizeof(buffer))
+
+	def close(self):
+		""" Releases the buffers. The session can still be used, they will be allocated again on the next capture. """
+		if self.size: self.free()
+		self.buffer = None
+		self.size = None
+
+class HeldFrame():
+	""" Pixels of an area taken at a given moment, from which any part can be read with grab as if it were the screen at that moment. """
+
+	def __init__(self, buffer, location):
+		self.buffer = buffer
+		self.location = location
+
+	def grab(self, location):
+		x, y = location.left-self.location.left, location.top-self.location.top
+		if x < 0 or y < 0 or x+location.width > self.location.width or y+location.height > self.location.height:
+			raise ValueError("The area {} is outside the frame {}".format(location, self.location))
+		src = memoryview(self.buffer).cast("B")
+		buffer = (RGBQUAD*(location.width*location.height))()
+		dest = memoryview(buffer).cast("B")
+		rowSize, srcRowSize = location.width*4, self.location.width*4
+		for row in range(location.height):
+			start = (y+row)*srcRowSize+x*4
+			dest[row*rowSize:(row+1)*rowSize] = src[start:start+rowSize]
+		return buffer
+
+	def close(self):
+		self.buffer = None
+
+class CursorSuppressor():
+	""" Keeps the mouse pointer hidden while any capture holds it, with acquire and release or as a context manager.
+	The pointer is hidden by the first acquire and restored once nobody holds it and delay seconds have passed without a new acquire,
+	so captures taken in quick succession, as in a burst or while watching, hide and restore it only once. """
+
+	def __init__(self, hide, restore, delay=1.0):
+		self.delay = delay
+		self.count = 0
+		self.hidden = False
+		# Number of times the pointer has actually been hidden.
+		self.hides = 0
+		self.__hide = hide
+		self.__restore = restore
+		self.__deadline = None
+		self.__condition = Condition()
+		self.__thread = None
+
+	def acquire(self):
+		with self.__condition:
+			self.count += 1
+			self.__deadline = None
+			if not self.hidden:
+				self.__hide()
+				self.hidden = True
+				self.hides += 1
+
+	def release(self):
+		with self.__condition:
+			self.count = max(self.count-1, 0)
+			if self.count or not self.hidden: return
+			self.__deadline = perf_counter()+self.delay
+			if not self.__thread:
+				self.__thread = Thread(target=self.__waitDeadline, name="screenshots.CursorSuppressor", daemon=True)
+				self.__thread.start()
+			self.__condition.notify()
+
+	def restoreNow(self):
+		""" Restores the pointer without waiting, unless a capture is holding it. """
+		with self.__condition:
+			if self.count or not self.hidden: return
+			self.__deadline = perf_counter()
+			self.__condition.notify()
+			if not self.__thread: self.__restoreLocked()
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, *exc):
+		self.release()
+
+	def __waitDeadline(self):
+		# A single thread waits for the restore deadline, which every acquire cancels and every last release moves.
+		with self.__condition:
+			while self.hidden:
+				if self.__deadline is None:
+					self.__condition.wait()
+					continue
+				remaining = self.__deadline-perf_counter()
+				if remaining > 0:
+					self.__condition.wait(remaining)
+					continue
+				self.__restoreLocked()
+			self.__thread = None
+
+	def __restoreLocked(self):
+		try:
+			self.__restore()
+		finally:
+			self.hidden = False
+			self.__deadline = None
+
+class GDIBackend(CaptureBackend):
+	""" Captures the screen through screenBitmap, that is GDI BitBlt. The mouse pointer is hidden during the capture through a CursorSuppressor. """
+
+	name = "gdi"
+
+	def __init__(self):
+		super(GDIBackend, self).__init__()
+		self.cursor = CursorSuppressor(self.hideCursor, self.restoreCursor)
+		self.__user32 = None
+		self.__transparentCursor = None
+
+	def capture(self, location):
+		import screenBitmap
+		with self.cursor:
+			return screenBitmap.ScreenBitmap(location.width, location.height).captureImage(location.left, location.top, location.width, location.height)
+
+	def openSession(self, holdCursor=True):
+		return GDISession(self, holdCursor=holdCursor)
+
+	def hold(self, location):
+		return GDIFrame(self, location)
+
+	def hideCursor(self):
+		# Set the mouse pointer to invisible mode. The transparent cursor is loaded from its file only once.
+		if not self.__transparentCursor:
+			self.__user32 = ctypes.WinDLL("user32")
+			for func in (self.__user32.LoadCursorFromFileW, self.__user32.CopyIcon):
+				func.restype = ctypes.c_void_p
+			self.__transparentCursor = self.__user32.LoadCursorFromFileW(os.path.join(os.path.dirname(__file__), "TransparentCursor.cur"))
+		# SetSystemCursor takes ownership of the cursor it receives, so each system cursor gets its own copy.
+		for cursorId in SYSTEM_CURSORS:
+			self.__user32.SetSystemCursor(ctypes.c_void_p(self.__user32.CopyIcon(ctypes.c_void_p(self.__transparentCursor))), cursorId)
+
+	def restoreCursor(self):
+		# Return the visible state to the mouse pointer, reloading the system cursors.
+		ctypes.windll.user32.SystemParametersInfoW(SPI_SETMOUSECURSOR, 0, None, SPIF_SENDCHANGE)
+
+def loadGDI():
+	""" Own instances of user32 and gdi32, so that setting restype does not affect the rest of NVDA. """
+	user32 = ctypes.WinDLL("user32")
+	gdi32 = ctypes.WinDLL("gdi32")
+	for func in (user32.GetDC, gdi32.CreateCompatibleDC, gdi32.CreateCompatibleBitmap, gdi32.SelectObject):
+		func.restype = ctypes.c_void_p
+	return user32, gdi32
+
+class GDISession(CaptureSession):
+	""" Keeps the screen DC, the memory DC and the DIB of screenBitmap alive between captures.
+	With holdCursor the mouse pointer stays hidden from the first capture until the session is closed, otherwise it is hidden during each capture.
+	With a source DC, the session copies from it instead of from the screen, origin being the screen coordinates of its top left corner. """
+
+	def __init__(self, backend, source=None, origin=(0, 0), holdCursor=True):
+		super(GDISession, self).__init__(backend)
+		self.source = source
+		self.origin = origin
+		self.holdCursor = holdCursor and not source
+
+	def allocate(self, width, height):
+		if self.holdCursor: self.backend.cursor.acquire()
+		self.__user32, self.__gdi32 = loadGDI()
+		self.__screenDC = self.__user32.GetDC(None)
+		self.__memDC = self.__gdi32.CreateCompatibleDC(ctypes.c_void_p(self.__screenDC))
+		self.__memBitmap = self.__gdi32.CreateCompatibleBitmap(ctypes.c_void_p(self.__screenDC), width, height)
+		self.__gdi32.SelectObject(ctypes.c_void_p(self.__memDC), ctypes.c_void_p(self.__memBitmap))
+		self.__info = BITMAPINFOHEADER()
+		self.__info.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+		self.__info.biWidth = width
+		# Negative height, top-down rows as screenBitmap.
+		self.__info.biHeight = -height
+		self.__info.biPlanes = 1
+		self.__info.biBitCount = 32
+		self.__info.biCompression = BI_RGB
+
+	def free(self):
+		self.__gdi32.DeleteDC(ctypes.c_void_p(self.__memDC))
+		self.__gdi32.DeleteObject(ctypes.c_void_p(self.__memBitmap))
+		self.__user32.ReleaseDC(None, ctypes.c_void_p(self.__screenDC))
+		if self.holdCursor: self.backend.cursor.release()
+
+	def captureInto(self, location, buffer):
+		w, h = location.width, location.height
+		if self.source or self.holdCursor:
+			self.__blit(location, w, h)
+		else:
+			# The suppressor keeps the pointer hidden between captures closer than its delay, and restores it between those further apart.
+			with self.backend.cursor:
+				self.__blit(location, w, h)
+		self.__gdi32.GetDIBits(ctypes.c_void_p(self.__memDC), ctypes.c_void_p(self.__memBitmap), 0, h, buffer, ctypes.byref(self.__info), DIB_RGB_COLORS)
+
+	def __blit(self, location, w, h):
+		self.__gdi32.StretchBlt(ctypes.c_void_p(self.__memDC), 0, 0, w, h, ctypes.c_void_p(self.source or self.__screenDC),
+		location.left-self.origin[0], location.top-self.origin[1], w, h, SRCCOPY)
+
+class GDIFrame():
+	""" An area of the screen copied at once into a GDI bitmap, which is read in strips by grab.
+	The pixels are those of the moment the frame was created, without keeping a second copy of the whole area in the memory of NVDA. """
+
+	def __init__(self, backend, location):
+		self.location = location
+		self.__session = None
+		self.__user32, self.__gdi32 = loadGDI()
+		screenDC = self.__user32.GetDC(None)
+		try:
+			self.__memDC = self.__gdi32.CreateCompatibleDC(ctypes.c_void_p(screenDC))
+			self.__bitmap = self.__gdi32.CreateCompatibleBitmap(ctypes.c_void_p(screenDC), location.width, location.height)
+			self.__gdi32.SelectObject(ctypes.c_void_p(self.__memDC), ctypes.c_void_p(self.__bitmap))
+			start = perf_counter()
+			with backend.cursor:
+				self.__gdi32.BitBlt(ctypes.c_void_p(self.__memDC), 0, 0, location.width, location.height,
+				ctypes.c_void_p(screenDC), location.left, location.top, SRCCOPY)
+			backend.record(start)
+		finally:
+			self.__user32.ReleaseDC(None, ctypes.c_void_p(screenDC))
+		self.__session = GDISession(backend, self.__memDC, (location.left, location.top))
+
+	def __del__(self):
+		self.close()
+
+	def grab(self, location):
+		""" The returned array is overwritten by the next grab. """
+		return self.__session.grab(location)
+
+	def close(self):
+		if not self.__session: return
+		self.__session.close()
+		self.__session = None
+		self.__gdi32.DeleteDC(ctypes.c_void_p(self.__memDC))
+		self.__gdi32.DeleteObject(ctypes.c_void_p(self.__bitmap))
+
+class SyntheticBackend(CaptureBackend):
+	""" Captures from an in-memory BGRA framebuffer of the given size. The pixels can be changed with fill and setPixel. """
+
+	name = "synthetic"
+
+	def __init__(self, width, height, color=(0, 0, 0, 0)):
+		super(SyntheticBackend, self).__init__()
+		self.width = width
+		self.height = height
+		self.framebuffer = bytearray(bytes(color)*(width*height))
+
+	def fill(self, left, top, width, height, color):
+		""" Paints a rectangle with a (blue, green, red, alpha) color. """
+		right, bottom = min(left+width, self.width), min(top+height, self.height)
+		left, top = max(left, 0), max(top, 0)
+		if right <= left or bottom <= top: return
+		row = bytes(color)*(right-left)
+		for y in range(top, bottom):
+			start = (y*self.width+left)*4
+			self.framebuffer[start:start+len(row)] = row
+
+	def setPixel(self, x, y, color):
+		start = (y*self.width+x)*4
+		self.framebuffer[start:start+4] = bytes(color)
+
+	def capture(self, location):
+		buffer = (RGBQUAD*(location.width*location.height))()
+		self.copyInto(location, buffer)
+		return buffer
+
+	def openSession(self, holdCursor=True):
+		return SyntheticSession(self)
+
+	def copyInto(self, location, buffer):
+		x, y, w, h = location
+		if w <= 0 or h <= 0 or x < 0 or y < 0 or x+w > self.width or y+h > self.height:
+			raise ValueError("The area {} is outside the framebuffer".format(location))
+		dest = memoryview(buffer).cast("B")
+		rowSize = w*4
+		for row in range(h):
+			start = ((y+row)*self.width+x)*4
+			dest[row*rowSize:(row+1)*rowSize] = self.framebuffer[start:start+rowSize]
+
+class SyntheticSession(CaptureSession):
+
+	def captureInto(self, location, buffer):
+		self.backend.copyInto(location, buffer)
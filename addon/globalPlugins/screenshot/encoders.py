@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Streaming image encoders for the screenshots wizard NVDA addon.
+Very large areas are held by the capture backend and read in horizontal strips, each strip is written to the file before reading the next one,
+so the memory used by NVDA depends on the size of the strips and not on the size of the image.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from .imageOps import bgraToRGB
+import os
+import struct
+import zlib
+
+# Names of the wx.Image options, the same strings as wx.IMAGE_OPTION_*
+OPTION_PNG_COMPRESSION_LEVEL = "PngZL"
+OPTION_PNG_FILTER = "PngF"
+OPTION_QUALITY = "quality"
+OPTION_TIFF_COMPRESSION = "Compression"
+
+pngFilters = {
+"none": 0x08,
+"sub": 0x10,
+"up": 0x20,
+"average": 0x40,
+"paeth": 0x80
+}
+
+tiffCompressions = {
+"none": 1,
+"lzw": 5,
+"deflate": 32946
+}
+
+# Settings of the fast preset, trading size for encoding time.
+fastPreset = {
+"pngCompression": 1,
+"pngFilter": "none",
+"jpegQuality": 75,
+"tiffCompression": "none"
+}
+
+def formatFromPath(path, default=None):
+	""" Returns the format of the file by its extension, as written in the settings (PNG, JPG, TIFF...) """
+	format = os.path.splitext(path)[1][1:].upper()
+	return {"TIF": "TIFF", "JPEG": "JPG"}.get(format, format) if format else default
+
+def getEncoderOptions(format, settings):
+	""" Returns a dictionary of wx.Image options for the format, from the screenshots settings.
+	If the encoder preset is fast, its values replace those of the settings. """
+	settings = dict((key, settings[key]) for key in fastPreset)\
+	if settings["encoderPreset"] != "fast" else fastPreset
+	options = {}
+	if format == "PNG":
+		options[OPTION_PNG_COMPRESSION_LEVEL] = int(settings["pngCompression"])
+		if settings["pngFilter"] in pngFilters:
+			options[OPTION_PNG_FILTER] = pngFilters[settings["pngFilter"]]
+	elif format == "JPG":
+		options[OPTION_QUALITY] = int(settings["jpegQuality"])
+	elif format == "TIFF":
+		options[OPTION_TIFF_COMPRESSION] = tiffCompressions.get(settings["tiffCompression"], 1)
+	return options
+
+class PNGWriter():
+	""" Writes an 8 bits RGB PNG file row by row. """
+
+	def __init__(self, path, width, height, level=6):
+		self.width = width
+		self.height = height
+		self.rows = 0
+		self.__file = open(path, "wb")
+		self.__compressor = zlib.compressobj(level)
+		self.__file.write(b"\x89PNG\r\n\x1a\n")
+		self.__chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+	def writeRows(self, rgb):
+		""" Adds whole rows of RGB pixels. """
+		rowSize = self.width*3
+		data = bytearray()
+		for start in range(0, len(rgb), rowSize):
+			# Filter type 0, the rows are stored as they are.
+			data += b"\x00"
+			data += rgb[start:start+rowSize]
+		self.rows += len(rgb)//rowSize
+		compressed = self.__compressor.compress(bytes(data))
+		if compressed: self.__chunk(b"IDAT", compressed)
+
+	def close(self):
+		try:
+			self.__chunk(b"IDAT", self.__compressor.flush())
+			self.__chunk(b"IEND", b"")
+		finally:
+			self.__file.close()
+
+	def __chunk(self, kind, data):
+		self.__file.write(struct.pack(">I", len(data)))
+		self.__file.write(kind)
+		self.__file.write(data)
+		self.__file.write(struct.pack(">I", zlib.crc32(kind+data)))
+
+class TIFFWriter():
+	""" Writes an uncompressed RGB TIFF file strip by strip.
+	The strips are written as they arrive and the directory that points to them is written at the end. """
+
+	def __init__(self, path, width, height):
+		self.width = width
+		self.height = height
+		self.rows = 0
+		self.__rowsPerStrip = None
+		self.__offsets = []
+		self.__counts = []
+		self.__file = open(path, "wb")
+		# Little endian header, the offset of the directory will be filled in on close.
+		self.__file.write(b"II*\x00\x00\x00\x00\x00")
+
+	def writeRows(self, rgb):
+		""" Adds a strip of whole rows of RGB pixels. All the strips but the last one must have the same number of rows. """
+		rows = len(rgb)//(self.width*3)
+		if self.__rowsPerStrip is None: self.__rowsPerStrip = rows
+		self.__offsets.append(self.__file.tell())
+		self.__counts.append(len(rgb))
+		self.__file.write(rgb)
+		self.rows += rows
+
+	def close(self):
+		try:
+			self.__writeDirectory()
+		finally:
+			self.__file.close()
+
+	def __writeDirectory(self):
+		f = self.__file
+		if f.tell()%2: f.write(b"\x00")
+		bitsOffset = f.tell()
+		f.write(struct.pack("<HHH", 8, 8, 8))
+		offsetsOffset = f.tell()
+		f.write(struct.pack("<%dI" % len(self.__offsets), *self.__offsets))
+		countsOffset = f.tell()
+		f.write(struct.pack("<%dI" % len(self.__counts), *self.__counts))
+		SHORT, LONG = 3, 4
+		# A single value is stored in the entry itself, several values by offset.
+		single = len(self.__offsets) == 1
+		entries = [
+		(256, LONG, 1, self.width), # ImageWidth
+		(257, LONG, 1, self.height), # ImageLength
+		(258, SHORT, 3, bitsOffset), # BitsPerSample
+		(259, SHORT, 1, 1), # Compression: none
+		(262, SHORT, 1, 2), # PhotometricInterpretation: RGB
+		(273, LONG, len(self.__offsets), self.__offsets[0] if single else offsetsOffset), # StripOffsets
+		(277, SHORT, 1, 3), # SamplesPerPixel
+		(278, LONG, 1, self.__rowsPerStrip or self.height), # RowsPerStrip
+		(279, LONG, len(self.__counts), self.__counts[0] if single else countsOffset), # StripByteCounts
+		(284, SHORT, 1, 1) # PlanarConfiguration: chunky
+		]
+		if f.tell()%2: f.write(b"\x00")
+		directoryOffset = f.tell()
+		f.write(struct.pack("<H", len(entries)))
+		for tag, kind, count, value in entries:
+			if kind == SHORT and count == 1:
+				f.write(struct.pack("<HHIHH", tag, kind, count, value, 0))
+			else:
+				f.write(struct.pack("<HHII", tag, kind, count, value))
+		f.write(struct.pack("<I", 0))
+		f.seek(4)
+		f.write(struct.pack("<I", directoryOffset))
+
+writers = {
+"PNG": PNGWriter,
+"TIFF": TIFFWriter
+}
+
+class TiledCapture():
+	""" An area of the screen held by a frame of the capture backend, see CaptureBackend.hold, that will be read and encoded in strips of stripRows rows when it is saved.
+	It can be handed to the background writer in place of a wx.Image. The frame is released once saved, or by close if it is not going to be saved. """
+
+	def __init__(self, frame, location, format, stripRows=256):
+		if format not in writers: raise ValueError("Tiled capture is not available for {}".format(format))
+		self.frame = frame
+		self.location = location
+		self.format = format
+		self.stripRows = stripRows
+		self.options = {}
+
+	def SetOption(self, name, value):
+		""" Same as wx.Image.SetOption. Only the PNG compression level is used, the strips are always written without filter. """
+		self.options[name] = value
+
+	@property
+	def Width(self):
+		return self.location.width
+
+	@property
+	def Height(self):
+		return self.location.height
+
+	def SaveFile(self, path):
+		try:
+			# The extension chosen in the save dialog takes precedence over the configured format.
+			format = formatFromPath(path, self.format)
+			if format not in writers: return self.saveWhole(path)
+			return self.saveStrips(path, writers[format])
+		finally:
+			self.close()
+
+	def saveStrips(self, path, writerClass):
+		left, top, width, height = self.location
+		if writerClass is PNGWriter:
+			writer = PNGWriter(path, width, height, int(self.options.get(OPTION_PNG_COMPRESSION_LEVEL, 6)))
+		else:
+			writer = writerClass(path, width, height)
+		try:
+			for y in range(0, height, self.stripRows):
+				rows = min(self.stripRows, height-y)
+				strip = self.frame.grab(type(self.location)(left, top+y, width, rows))
+				writer.writeRows(bgraToRGB(strip, width, rows))
+				del strip
+		finally:
+			writer.close()
+		return writer.rows == height
+
+	def saveWhole(self, path):
+		""" Formats without a streaming writer, such as BMP, JPG or GIF, are encoded by wx from the whole image, as smaller areas. """
+		import wx
+		width, height = self.location.width, self.location.height
+		rgb = bgraToRGB(self.frame.grab(self.location), width, height)
+		image = wx.ImageFromBuffer(width, height, rgb)
+		for name, value in self.options.items():
+			image.SetOption(name, value)
+		return image.SaveFile(path)
+
+	def close(self):
+		if self.frame:
+			self.frame.close()
+			self.frame = None
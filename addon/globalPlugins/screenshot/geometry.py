@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Rectangles of the screen for the screenshots wizard NVDA addon.
+Used instead of locationHelper of NVDA when the addon modules run outside NVDA, for example with a SyntheticBackend.
+Only the part of locationHelper.RectLTWH that Rectangle uses is implemented, with the same behavior.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from collections import namedtuple
+
+Point = namedtuple("Point", ("x", "y"))
+
+class RectLTWH(namedtuple("RectLTWH", ("left", "top", "width", "height"))):
+	""" A rectangle given by its left and top coordinates, its width and its height. """
+
+	__slots__ = ()
+
+	@classmethod
+	def fromLTRB(cls, left, top, right, bottom):
+		return cls(left, top, right-left, bottom-top)
+
+	@property
+	def right(self):
+		return self.left+self.width
+
+	@property
+	def bottom(self):
+		return self.top+self.height
+
+	@property
+	def center(self):
+		return Point(int(round(self.left+self.width/2.0)), int(round(self.top+self.height/2.0)))
+
+	@property
+	def topLeft(self):
+		return Point(self.left, self.top)
+
+	@property
+	def topRight(self):
+		return Point(self.right, self.top)
+
+	@property
+	def bottomLeft(self):
+		return Point(self.left, self.bottom)
+
+	@property
+	def bottomRight(self):
+		return Point(self.right, self.bottom)
+
+	def intersection(self, other):
+		""" The area common to both rectangles, or an empty rectangle if they do not overlap. """
+		left, top = max(self.left, other.left), max(self.top, other.top)
+		right, bottom = min(self.right, other.right), min(self.bottom, other.bottom)
+		if left > right or top > bottom: return self.__class__(0, 0, 0, 0)
+		return self.fromLTRB(left, top, right, bottom)
+
+	def isSuperset(self, other):
+		return self.left <= other.left and self.top <= other.top and self.right >= other.right and self.bottom >= other.bottom
+
+	def expandOrShrink(self, margin):
+		return self.fromLTRB(self.left-margin, self.top-margin, self.right+margin, self.bottom+margin)
@@ -8,6 +8,7 @@ Copyright (C) Javi Dominguez 2021
 """
 
 from gui import guiHelper, NVDASettingsDialog
+from .settings import settings
 from gui.settingsDialogs import SettingsPanel
 import addonHandler
 import config
@@ -29,7 +30,7 @@ class ScreenshotsPanel(SettingsPanel):
 		sizerDir = wx.BoxSizer(wx.HORIZONTAL)
 		self.textPath = wx.TextCtrl (
 		self, style=wx.TE_RICH|wx.TE_NO_VSCROLL|wx.TE_WORDWRAP|wx.TE_MULTILINE|wx.TE_READONLY,
-		value =config.conf.profiles[0]["screenshots"]["folder"],  size=(300,20))
+		value =settings.folder,  size=(300,20))
 		sizerDir.Add(self.textPath)
 		self.buttonBrowse = wx.Button(self, wx.ID_ANY,
 		# TRANSLATORS: Label of the button to select folder.
@@ -38,32 +39,71 @@ class ScreenshotsPanel(SettingsPanel):
 		helper.addItem(sizerDir)
 		self.buttonBrowse.Bind(wx.EVT_BUTTON, self.onBrowse)
 
-		fileFormats = ["BMP", "JPG", "GIF", "PNG", "TIFF"]
+		self.fileFormats = ["BMP", "JPG", "GIF", "PNG", "TIFF"]
 		self.radioBoxFormat = wx.RadioBox(self, wx.ID_ANY,
 		# TRANSLATORS: Selecting the format of the image to be saved
-		_("File format"), choices=fileFormats, majorDimension=5, style=wx.RA_SPECIFY_COLS)
-		self.radioBoxFormat.SetSelection(fileFormats.index(config.conf.profiles[0]["screenshots"]["format"]))
+		_("File format"), choices=self.fileFormats, majorDimension=5, style=wx.RA_SPECIFY_COLS)
+		self.radioBoxFormat.SetSelection(self.fileFormats.index(settings.format) if settings.format in self.fileFormats else 3)
 		helper.addItem(self.radioBoxFormat)
 
+		self.presets = ["normal", "fast"]
+		self.radioBoxPreset = wx.RadioBox(self, wx.ID_ANY,
+		# TRANSLATORS: Selecting the encoder settings
+		_("Encoding"),
+		# TRANSLATORS: Encoder presets: normal uses the settings below, fast saves faster producing larger files.
+		choices=[_("Use the settings below"), _("Fast, larger files")], majorDimension=2, style=wx.RA_SPECIFY_COLS)
+		preset = settings.encoderPreset
+		self.radioBoxPreset.SetSelection(self.presets.index(preset) if preset in self.presets else 0)
+		helper.addItem(self.radioBoxPreset)
+
+		sizerPNG = guiHelper.BoxSizerHelper(self, orientation=wx.HORIZONTAL)
+		self.spinPNGCompression = sizerPNG.addLabeledControl(
+		# TRANSLATORS: Selecting the compression level of the PNG files
+		_("PNG compression level (0-9): "), wx.SpinCtrl, min=0, max=9, initial=int(settings.pngCompression))
+		self.pngFilters = ["auto", "none", "sub", "up", "average", "paeth"]
+		self.choicePNGFilter = sizerPNG.addLabeledControl(
+		# TRANSLATORS: Selecting the filter of the PNG files
+		_("PNG filter: "), wx.Choice,
+		# TRANSLATORS: PNG filters
+		choices=[_("Automatic"), _("None"), _("Sub"), _("Up"), _("Average"), _("Paeth")])
+		pngFilter = settings.pngFilter
+		self.choicePNGFilter.SetSelection(self.pngFilters.index(pngFilter) if pngFilter in self.pngFilters else 0)
+		helper.addItem(sizerPNG)
+
+		self.spinJPGQuality = helper.addLabeledControl(
+		# TRANSLATORS: Selecting the quality of the JPG files
+		_("JPG quality (1-100): "), wx.SpinCtrl, min=1, max=100, initial=int(settings.jpegQuality))
+
+		self.tiffCompressions = ["none", "lzw", "deflate"]
+		self.choiceTIFFCompression = helper.addLabeledControl(
+		# TRANSLATORS: Selecting the compression of the TIFF files
+		_("TIFF compression: "), wx.Choice,
+		# TRANSLATORS: TIFF compressions
+		choices=[_("None"), _("LZW"), _("Deflate")])
+		tiffCompression = settings.tiffCompression
+		self.choiceTIFFCompression.SetSelection(self.tiffCompressions.index(tiffCompression) if tiffCompression in self.tiffCompressions else 1)
+
 		self.checkboxEnlargement = wx.CheckBox(self, wx.ID_ANY,
 		# TRANSLATORS: Checkbox to toggle  images enlagement
 		label=_("Enlarge small images"))
-		if isinstance(config.conf.profiles[0]["screenshots"]["scale"], str):
-			l = True if config.conf.profiles[0]["screenshots"]["scale"].lower() == "true" else False
-		else:
-			l = config.conf.profiles[0]["screenshots"]["scale"]
-		self.checkboxEnlargement.SetValue(l)
-		""" try:
-			self.checkboxEnlargement.SetValue(config.conf.profiles[0]["screenshots"]["scale"])
-		except:
-			pass """
+		self.checkboxEnlargement.SetValue(settings.scale)
 		helper.addItem(self.checkboxEnlargement)
 
+		self.scaleMethods = ["nearest", "smooth"]
+		self.radioBoxScaleMethod = wx.RadioBox(self, wx.ID_ANY,
+		# TRANSLATORS: Selecting how small images are enlarged
+		_("Enlargement method"),
+		# TRANSLATORS: Enlargement methods: repeating the pixels keeps the edges sharp, smooth is slower and blurs the text.
+		choices=[_("Sharp, repeat pixels"), _("Smooth")], majorDimension=2, style=wx.RA_SPECIFY_COLS)
+		method = settings.scaleMethod
+		self.radioBoxScaleMethod.SetSelection(self.scaleMethods.index(method) if method in self.scaleMethods else 0)
+		helper.addItem(self.radioBoxScaleMethod)
+
 		self.radioBoxAction = wx.RadioBox(self, wx.ID_ANY,
 		# TRANSLATORS: Select what to do after saving the file
 		_("After saving the screenshot"),
 		choices=[_("Nothing"), _("Open file"), _("Open folder")], majorDimension=3, style=wx.RA_SPECIFY_COLS)
-		self.radioBoxAction.SetSelection(int(config.conf.profiles[0]["screenshots"]["action"]))
+		self.radioBoxAction.SetSelection(settings.action)
 		helper.addItem(self.radioBoxAction)
 
 		sizerStep = wx.BoxSizer(wx.HORIZONTAL)
@@ -71,10 +111,38 @@ class ScreenshotsPanel(SettingsPanel):
 		# TRANSLATORS: Selecting the number of pixels per step when the rectangle coordinates are modified.
 		_("Movement unit (in pixels): "))
 		sizerStep.Add(labelStep)
-		self.spin_ctrl = wx.SpinCtrl(self, wx.ID_ANY, str(config.conf.profiles[0]["screenshots"]["step"]), min=1, max=10)
+		self.spin_ctrl = wx.SpinCtrl(self, wx.ID_ANY, str(settings.step), min=1, max=10)
 		sizerStep.Add(self.spin_ctrl)
 		helper.addItem(sizerStep)
 
+		sizerBurst = guiHelper.BoxSizerHelper(self, orientation=wx.HORIZONTAL)
+		self.spinBurstCount = sizerBurst.addLabeledControl(
+		# TRANSLATORS: Selecting the number of screenshots taken in a burst.
+		_("Screenshots per burst: "), wx.SpinCtrl, min=2, max=1000, initial=int(settings.burstCount))
+		self.spinBurstInterval = sizerBurst.addLabeledControl(
+		# TRANSLATORS: Selecting the time between the screenshots of a burst.
+		_("Interval between screenshots in milliseconds, 0 as fast as possible: "), wx.SpinCtrl, min=0, max=60000, initial=int(settings.burstInterval))
+		helper.addItem(sizerBurst)
+
+		self.spinWatchInterval = helper.addLabeledControl(
+		# TRANSLATORS: Selecting how often the rectangle is checked for changes in watch mode.
+		_("Watch mode, check for changes every (milliseconds): "), wx.SpinCtrl, min=100, max=60000, initial=int(settings.watchInterval))
+
+		self.sidecars = ["none", "txt", "json"]
+		self.choiceSidecar = helper.addLabeledControl(
+		# TRANSLATORS: Selecting whether the text recognized in each screenshot is saved in a file next to the image.
+		_("Save the recognized text with each screenshot: "), wx.Choice,
+		# TRANSLATORS: Files where the recognized text is saved: none, only the text, or the text with the position of each word.
+		choices=[_("No"), _("Text file"), _("JSON file with the position of the words")])
+		sidecar = settings.sidecar
+		self.choiceSidecar.SetSelection(self.sidecars.index(sidecar) if sidecar in self.sidecars else 0)
+
+		self.checkboxIndexText = wx.CheckBox(self, wx.ID_ANY,
+		# TRANSLATORS: Checkbox to recognize the text of the screenshots, so that they can be searched by their text
+		label=_("Index the text of the screenshots for searching"))
+		self.checkboxIndexText.SetValue(settings.indexText)
+		helper.addItem(self.checkboxIndexText)
+
 	def onBrowse(self, evt):
 		dlg = wx.DirDialog(self,
 		# TRANSLATORS: Title of the dialog where to select the folder
@@ -86,11 +154,22 @@ class ScreenshotsPanel(SettingsPanel):
 
 	def onSave(self):
 		config.conf.profiles[-1].name = self.originalProfileName
-		config.conf.profiles[0]["screenshots"]["folder"] = self.textPath.GetValue()
-		config.conf.profiles[0]["screenshots"]["format"] = self.radioBoxFormat.GetStringSelection()
-		config.conf.profiles[0]["screenshots"]["action"] = int(self.radioBoxAction.GetSelection())
-		config.conf.profiles[0]["screenshots"]["scale"] = self.checkboxEnlargement.GetValue()
-		config.conf.profiles[0]["screenshots"]["step"] = self.spin_ctrl.GetValue()
+		settings.set("folder", self.textPath.GetValue())
+		settings.set("format", self.fileFormats[self.radioBoxFormat.GetSelection()])
+		settings.set("encoderPreset", self.presets[self.radioBoxPreset.GetSelection()])
+		settings.set("pngCompression", self.spinPNGCompression.GetValue())
+		settings.set("pngFilter", self.pngFilters[self.choicePNGFilter.GetSelection()])
+		settings.set("jpegQuality", self.spinJPGQuality.GetValue())
+		settings.set("tiffCompression", self.tiffCompressions[self.choiceTIFFCompression.GetSelection()])
+		settings.set("action", int(self.radioBoxAction.GetSelection()))
+		settings.set("scale", self.checkboxEnlargement.GetValue())
+		settings.set("scaleMethod", self.scaleMethods[self.radioBoxScaleMethod.GetSelection()])
+		settings.set("step", self.spin_ctrl.GetValue())
+		settings.set("burstCount", self.spinBurstCount.GetValue())
+		settings.set("burstInterval", self.spinBurstInterval.GetValue())
+		settings.set("watchInterval", self.spinWatchInterval.GetValue())
+		settings.set("sidecar", self.sidecars[self.choiceSidecar.GetSelection()])
+		settings.set("indexText", self.checkboxIndexText.GetValue())
 
 	def onDiscard(self):
 		config.conf.profiles[-1].name = self.originalProfileName
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Pixel operations for the screenshots wizard NVDA addon.
+They work on the raw BGRA buffers returned by the capture backends, through the buffer protocol.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+def bgraToRGB(buffer, width, height, stripRows=64):
+	""" Returns a bytearray with the RGB pixels of a top-down BGRA buffer, ready for wx.ImageFromBuffer.
+	This is the only copy of the image. The buffer is read in strips of stripRows rows and the channels are reordered with extended slices,
+	so the only temporary memory is one strip. """
+	src = memoryview(buffer).cast("B")
+	rgb = bytearray(width*height*3)
+	for top in range(0, height, stripRows):
+		bottom = min(top+stripRows, height)
+		strip = src[top*width*4:bottom*width*4].tobytes()
+		start, end = top*width*3, bottom*width*3
+		rgb[start:end:3] = strip[2::4]
+		rgb[start+1:end:3] = strip[1::4]
+		rgb[start+2:end:3] = strip[0::4]
+	return rgb
+
+def scaleNearest(rgb, width, height, factor, channels=3):
+	""" Enlarges an image by an integer factor repeating each pixel, so the edges of the text remain sharp.
+	It works for RGB pixels and, with channels=4, for BGRA buffers. Returns a bytearray with the pixels of the enlarged image. """
+	if factor == 1: return bytearray(rgb)
+	if not isinstance(rgb, (bytes, bytearray)): rgb = memoryview(rgb).cast("B").tobytes()
+	# Each pixel repeated horizontally, all the rows at once.
+	wide = bytearray(width*height*channels*factor)
+	for k in range(factor):
+		for channel in range(channels):
+			wide[k*channels+channel::channels*factor] = rgb[channel::channels]
+	# Then each row repeated vertically.
+	rowSize = width*channels*factor
+	scaled = bytearray(rowSize*factor*height)
+	for row in range(height):
+		scaled[row*rowSize*factor:(row+1)*rowSize*factor] = wide[row*rowSize:(row+1)*rowSize]*factor
+	return scaled
+
+def crop(buffer, width, left, top, cropWidth, cropHeight, channels=4):
+	""" Returns a bytearray with the pixels of an area of an image buffer of the given width. """
+	src = memoryview(buffer).cast("B")
+	rowSize = cropWidth*channels
+	area = bytearray(rowSize*cropHeight)
+	for row in range(cropHeight):
+		start = ((top+row)*width+left)*channels
+		area[row*rowSize:(row+1)*rowSize] = src[start:start+rowSize]
+	return area
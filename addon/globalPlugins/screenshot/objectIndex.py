@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Spatial index of objects for the screenshots wizard NVDA addon.
+Finds the object under a point of the screen without a cross-process hit test for each key press.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from collections import deque
+from threading import Lock
+
+class ObjectIndex():
+	""" Grid of cells of cellSize pixels, each cell holds the objects whose visible area overlaps it.
+	It is built once from the foreground window when the wizard opens, and then updated object by object with update and remove.
+	It is complete only if the whole tree was walked, otherwise the objects that are not in it must be found by hit testing. """
+
+	def __init__(self, cellSize=256, maxObjects=2000):
+		self.cellSize = cellSize
+		self.maxObjects = maxObjects
+		self.ready = False
+		self.complete = False
+		self.cancelled = False
+		self.queries = 0
+		self.hits = 0
+		self.__cells = {}
+		self.__entries = {}
+		self.__rootArea = None
+		self.__lock = Lock()
+
+	def build(self, root):
+		""" Walks the descendants of root breadth first, up to maxObjects, and indexes their visible areas.
+		The visible area of an object is its location clipped by the visible area of its parent.
+		The walk stops as soon as cancel is called. """
+		try:
+			rootArea = self.__area(root.location)
+			if not rootArea: return
+			self.__rootArea = rootArea
+			pending = deque([(root, rootArea, 0)])
+			count = 0
+			walked = True
+			while pending:
+				if self.cancelled: return
+				obj, clip, depth = pending.popleft()
+				self.insert(obj, clip, depth)
+				count += 1
+				if count >= self.maxObjects: return
+				try:
+					children = [(child, self.__area(child.location)) for child in obj.children or []]
+				except Exception:
+					# The object may have disappeared while walking the tree. Its descendants will be missing.
+					walked = False
+					continue
+				for child, area in children:
+					area = self.__intersection(area, clip)
+					if area: pending.append((child, area, depth+1))
+			self.complete = walked and not self.cancelled
+		finally:
+			self.ready = True
+
+	def cancel(self):
+		""" Stops the build, when the index is no longer needed or is replaced by the one of another window. """
+		self.cancelled = True
+
+	def insert(self, obj, area, depth):
+		""" Indexes obj with its visible area (left, top, right, bottom) and its depth in the tree of objects. """
+		with self.__lock:
+			self.__remove(obj)
+			entry = (obj, area, depth)
+			self.__entries[id(obj)] = entry
+			for cell in self.__cellsOf(area):
+				self.__cells.setdefault(cell, []).append(entry)
+
+	def update(self, obj):
+		""" Indexes obj again with its current location, clipped by the root.
+		An object that was not in the index is added only if its parent is, one level below it and clipped by it,
+		other objects, such as those of another window, are ignored. """
+		if not self.__rootArea: return
+		with self.__lock:
+			entry = self.__entries.get(id(obj))
+		if entry and entry[0] is obj:
+			depth, clip = entry[2], self.__rootArea
+		else:
+			try:
+				parent = obj.parent
+			except Exception:
+				return
+			with self.__lock:
+				parentEntry = self.__entries.get(id(parent))
+			if not parentEntry or parentEntry[0] is not parent: return
+			depth, clip = parentEntry[2]+1, parentEntry[1]
+		area = self.__intersection(self.__area(obj.location), clip)
+		if area:
+			self.insert(obj, area, depth)
+		else:
+			self.remove(obj)
+
+	def remove(self, obj):
+		with self.__lock:
+			self.__remove(obj)
+
+	def objectAt(self, x, y):
+		""" Returns the deepest indexed object whose visible area contains the point, or None if there is none or the index is not ready. """
+		if not self.ready: return None
+		self.queries += 1
+		with self.__lock:
+			candidates = [e for e in self.__cells.get((x//self.cellSize, y//self.cellSize), [])
+			if e[1][0] <= x < e[1][2] and e[1][1] <= y < e[1][3]]
+		if not candidates: return None
+		self.hits += 1
+		# Deepest first, and of the same depth the smallest one.
+		return min(candidates, key=lambda e: (-e[2], (e[1][2]-e[1][0])*(e[1][3]-e[1][1])))[0]
+
+	def __len__(self):
+		return len(self.__entries)
+
+	def __remove(self, obj):
+		entry = self.__entries.get(id(obj))
+		# The object is kept in the entry, so its id cannot belong to another object while it is indexed.
+		if not entry or entry[0] is not obj: return
+		del self.__entries[id(obj)]
+		for cell in self.__cellsOf(entry[1]):
+			bucket = self.__cells.get(cell)
+			if not bucket: continue
+			# Compared by identity, comparing NVDA objects for equality would be cross-process calls.
+			bucket[:] = [e for e in bucket if e is not entry]
+			if not bucket: del self.__cells[cell]
+
+	def __cellsOf(self, area):
+		left, top, right, bottom = area
+		for cx in range(left//self.cellSize, (right-1)//self.cellSize+1):
+			for cy in range(top//self.cellSize, (bottom-1)//self.cellSize+1):
+				yield (cx, cy)
+
+	def __area(self, location):
+		if not location or location.width <= 0 or location.height <= 0: return None
+		return (location.left, location.top, location.left+location.width, location.top+location.height)
+
+	def __intersection(self, a, b):
+		if not a or not b: return None
+		area = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+		return area if area[0] < area[2] and area[1] < area[3] else None
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+OCR service for the screenshots wizard NVDA addon.
+Sits between the wizard and a content recognizer of NVDA, such as uwpOcr.UwpOcr:
+identical captures are answered from a cache, and a new request while another is being recognized replaces it instead of stacking.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from .imageOps import crop, scaleNearest
+from collections import OrderedDict, deque
+from hashlib import blake2b
+from threading import Lock, Thread
+from time import perf_counter
+import ctypes
+import json
+import os
+try:
+	from logHandler import log
+except ImportError:
+	# Outside NVDA, for example when the service is exercised with a fake recognizer.
+	import logging
+	log = logging.getLogger(__name__)
+
+def startInThread(func, *args):
+	""" Default way of starting a recognition that follows another one: a new thread, so that it does not run inside the callback of the engine. """
+	Thread(target=func, args=args, name="screenshots.OCR", daemon=True).start()
+
+def estimateResultSize(result):
+	""" Approximate memory used by a recognition result, in bytes. For LinesWordsResult, by the words it contains. """
+	data = getattr(result, "data", None)
+	if not data: return 1024
+	try:
+		return sum(len(word.get("text", ""))+64 for line in data for word in line)
+	except (TypeError, AttributeError):
+		return 1024
+
+class ResultCache():
+	""" Least recently used cache of recognition results, limited by the estimated memory of the results. """
+
+	def __init__(self, maxBytes=1024*1024, sizeOf=estimateResultSize):
+		self.maxBytes = maxBytes
+		self.sizeOf = sizeOf
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.__entries = OrderedDict()
+
+	def get(self, key):
+		entry = self.__entries.get(key)
+		if entry is None:
+			self.misses += 1
+			return None
+		self.__entries.move_to_end(key)
+		self.hits += 1
+		return entry[0]
+
+	def put(self, key, result):
+		size = self.sizeOf(result)
+		if size > self.maxBytes: return
+		if key in self.__entries: self.size -= self.__entries.pop(key)[1]
+		self.__entries[key] = (result, size)
+		self.size += size
+		while self.size > self.maxBytes:
+			self.size -= self.__entries.popitem(last=False)[1][1]
+
+	def clear(self):
+		self.__entries.clear()
+		self.size = 0
+
+	def __len__(self):
+		return len(self.__entries)
+
+class OCRService():
+	""" Recognizes captures with engine, any object with the recognize(pixels, imgInfo, onResult) method of contentRecog.ContentRecognizer.
+	Only one recognition is in progress at a time. A request that arrives meanwhile waits, and if supersede is True, replaces any other waiting request.
+	The result of a recognition whose request has been replaced is cached but not delivered.
+	With supersede False the requests wait in turn and every one of them is answered. If maxPending requests are already waiting,
+	the oldest one is dropped, so that the pixels kept for recognition are bounded, and it is answered with None.
+	The waiting request is started through schedule and never from the callback of the engine: uwpOcr.UwpOcr terminates its recognition
+	and forgets its callback after calling it, which would kill a new recognition started by the callback itself. """
+
+	def __init__(self, engine, cache=None, dispatch=None, supersede=True, schedule=None, maxPending=None):
+		self.engine = engine
+		self.cache = cache if cache else ResultCache()
+		self.supersede = supersede
+		self.maxPending = maxPending
+		# Function used to deliver the results, for example wx.CallAfter. By default they are delivered in the thread of the engine.
+		self.__dispatch = dispatch if dispatch else lambda func, *args: func(*args)
+		# Function used to start the waiting request once the engine has answered, for example wx.CallAfter.
+		self.__schedule = schedule if schedule else startInThread
+		self.__lock = Lock()
+		self.__current = None
+		self.__pending = deque()
+		self.superseded = 0
+		self.dropped = 0
+
+	def getKey(self, pixels, location):
+		""" The same pixels in the same place of the screen give the same result. """
+		return (blake2b(memoryview(pixels).cast("B"), digest_size=16).digest(), tuple(location))
+
+	def recognize(self, pixels, imgInfo, location, onResult):
+		""" Recognizes pixels, captured from location, and calls onResult with the result, with an exception, or with None if the request was dropped. """
+		key = self.getKey(pixels, location)
+		request = dropped = None
+		with self.__lock:
+			result = self.cache.get(key)
+			if result is None:
+				request = (key, pixels, imgInfo, onResult)
+				if self.__current:
+					if self.supersede and self.__pending:
+						self.superseded += 1
+						self.__pending.clear()
+					elif self.maxPending and len(self.__pending) >= self.maxPending:
+						self.dropped += 1
+						dropped = self.__pending.popleft()
+					self.__pending.append(request)
+					request = None
+				else:
+					self.__current = request
+		if dropped: self.__dispatch(dropped[3], None)
+		if result is not None:
+			self.__dispatch(onResult, result)
+		elif request:
+			self.__start(request)
+
+	@property
+	def busy(self):
+		return self.__current is not None
+
+	@property
+	def pending(self):
+		return len(self.__pending)
+
+	def __start(self, request):
+		key, pixels, imgInfo, onResult = request
+		try:
+			self.engine.recognize(pixels, imgInfo, lambda result: self.__onEngineResult(request, result))
+		except Exception as inst:
+			self.__onEngineResult(request, inst)
+
+	def __onEngineResult(self, request, result):
+		key, pixels, imgInfo, onResult = request
+		answered = []
+		with self.__lock:
+			if not isinstance(result, Exception): self.cache.put(key, result)
+			if self.supersede and self.__pending:
+				# A newer request is waiting, this result is no longer wanted.
+				self.superseded += 1
+			else:
+				answered.append((onResult, result))
+			# The waiting requests already in the cache are answered without recognizing them.
+			self.__current = None
+			while self.__pending:
+				following = self.__pending.popleft()
+				cached = self.cache.get(following[0])
+				if cached is None:
+					self.__current = following
+					break
+				answered.append((following[3], cached))
+			following = self.__current
+		for func, value in answered:
+			self.__dispatch(func, value)
+		if following: self.__schedule(self.__start, following)
+
+def asPixelArray(data):
+	""" Wraps a bytearray in a ctypes array, which is what the recognizers pass to their dlls. """
+	return (ctypes.c_ubyte*len(data)).from_buffer(data)
+
+class TiledRecognizer():
+	""" Recognizer that splits large images into overlapping tiles and recognizes concurrency tiles at a time, then merges the words of all the tiles in reading order.
+	Images that the recognizer wants enlarged, according to the resize factor of imgInfo, are enlarged before recognizing them.
+	Each image or tile is recognized by a new engine made by makeEngine, such as uwpOcr.UwpOcr, since UwpOcr keeps the handle of its recognition
+	in the instance and clears it after answering. The next tile is started through schedule, never from the callback of an engine.
+	makeImageInfo(left, top, width, height) builds the RecogImageInfo of a tile and makeResult(data, imgInfo) the merged LinesWordsResult. """
+
+	def __init__(self, makeEngine, concurrency=2, makeImageInfo=None, makeResult=None, tileSize=1600, overlap=64, schedule=None):
+		self.makeEngine = makeEngine
+		self.concurrency = concurrency
+		# Engine that answers getResizeFactor, it does not recognize anything.
+		self.engine = makeEngine()
+		self.schedule = schedule if schedule else startInThread
+		self.makeImageInfo = makeImageInfo if makeImageInfo else lambda left, top, width, height: self.__contentRecog().RecogImageInfo(left, top, width, height, 1)
+		self.makeResult = makeResult if makeResult else lambda data, imgInfo: self.__contentRecog().LinesWordsResult(data, imgInfo)
+		self.tileSize = tileSize
+		self.overlap = overlap
+		self.lastTimings = []
+
+	def __contentRecog(self):
+		import contentRecog
+		return contentRecog
+
+	def getResizeFactor(self, width, height):
+		return self.engine.getResizeFactor(width, height)
+
+	def recognize(self, pixels, imgInfo, onResult):
+		width, height = imgInfo.screenWidth, imgInfo.screenHeight
+		factor = int(getattr(imgInfo, "resizeFactor", 1))
+		if factor > 1:
+			# Too small for the recognizer, which expects the image already enlarged to recogWidth per recogHeight.
+			self.makeEngine().recognize(asPixelArray(scaleNearest(pixels, width, height, factor, channels=4)), imgInfo, onResult)
+			return
+		if width <= self.tileSize and height <= self.tileSize:
+			self.makeEngine().recognize(pixels, imgInfo, onResult)
+			return
+		tiles = [(left, top, tileWidth, tileHeight)
+		for top, tileHeight in self.split(height)
+		for left, tileWidth in self.split(width)]
+		TileJob(self, pixels, imgInfo, tiles, onResult).start()
+
+	def split(self, size):
+		""" Returns (start, length) of the tiles along one side of size pixels.
+		All the tiles have the same length, so that none of them is a thin strip too small to be recognized. """
+		if size <= self.tileSize: return [(0, size)]
+		count = -(-(size-self.overlap)//(self.tileSize-self.overlap))
+		length = -(-(size+(count-1)*self.overlap)//count)
+		return [(min(i*(length-self.overlap), size-length), length) for i in range(count)]
+
+	def merge(self, imgInfo, tiles, results):
+		""" Joins the words of the tiles in a list of lines of the whole image.
+		A word in the overlap of two tiles is kept only from the tile where its center is farther from the edge. """
+		half = self.overlap//2
+		words = []
+		for (left, top, width, height), data in zip(tiles, results):
+			if not data: continue
+			# Area of the tile whose words belong to it
+			minX = left+half if left else 0
+			minY = top+half if top else 0
+			maxX = left+width-half if left+width < imgInfo.screenWidth else left+width
+			maxY = top+height-half if top+height < imgInfo.screenHeight else top+height
+			for line in data:
+				for word in line:
+					x, y = word["x"]+left, word["y"]+top
+					centerX, centerY = x+word["width"]/2, y+word["height"]/2
+					if minX <= centerX < maxX and minY <= centerY < maxY:
+						words.append(dict(word, x=x, y=y))
+		# Reading order: lines from top to bottom, words from left to right.
+		words.sort(key=lambda w: (w["y"]+w["height"]/2, w["x"]))
+		lines = []
+		for word in words:
+			centerY = word["y"]+word["height"]/2
+			line = lines[-1] if lines else None
+			if line and abs(centerY-line[0]) <= max(line[1], word["height"])/2:
+				line[2].append(word)
+			else:
+				lines.append([centerY, word["height"], [word]])
+		return [sorted(line[2], key=lambda w: w["x"]) for line in lines]
+
+class TileJob():
+	""" Recognition of the tiles of an image by a TiledRecognizer, as many at a time as its concurrency. """
+
+	def __init__(self, recognizer, pixels, imgInfo, tiles, onResult):
+		self.recognizer = recognizer
+		self.pixels = pixels
+		self.imgInfo = imgInfo
+		self.tiles = tiles
+		self.onResult = onResult
+		self.results = [None]*len(tiles)
+		self.timings = [None]*len(tiles)
+		self.errors = 0
+		self.__next = 0
+		self.__done = 0
+		self.__lock = Lock()
+
+	def start(self):
+		for i in range(self.recognizer.concurrency):
+			self.__startNext()
+
+	def __startNext(self):
+		with self.__lock:
+			if self.__next >= len(self.tiles): return
+			index = self.__next
+			self.__next += 1
+		left, top, width, height = self.tiles[index]
+		tilePixels = asPixelArray(crop(self.pixels, self.imgInfo.screenWidth, left, top, width, height))
+		tileInfo = self.recognizer.makeImageInfo(self.imgInfo.screenLeft+left, self.imgInfo.screenTop+top, width, height)
+		start = perf_counter()
+		try:
+			self.recognizer.makeEngine().recognize(tilePixels, tileInfo, lambda result: self.__onTileResult(index, start, result))
+		except Exception as inst:
+			self.__onTileResult(index, start, inst)
+
+	def __onTileResult(self, index, start, result):
+		self.timings[index] = perf_counter()-start
+		log.debug("OCR tile {} of {} {} recognized in {:.3f} s".format(index+1, len(self.tiles), self.tiles[index], self.timings[index]))
+		with self.__lock:
+			if isinstance(result, Exception):
+				self.errors += 1
+			else:
+				self.results[index] = getattr(result, "data", None)
+			self.__done += 1
+			finished = self.__done == len(self.tiles)
+		if not finished:
+			# Outside the callback of the engine, which is not yet done with its recognition.
+			self.recognizer.schedule(self.__startNext)
+			return
+		self.recognizer.lastTimings = self.timings
+		if self.errors == len(self.tiles):
+			self.onResult(result)
+			return
+		data = self.recognizer.merge(self.imgInfo, self.tiles, self.results)
+		self.onResult(self.recognizer.makeResult(data, self.imgInfo))
+
+sidecarExtensions = {"txt": ".txt", "json": ".json"}
+
+def resultText(result):
+	""" Text of a LinesWordsResult, a line of text for each line of words. """
+	return "\n".join(" ".join(word.get("text", "") for word in line) for line in (getattr(result, "data", None) or []))
+
+def resultWords(result, imgInfo):
+	""" Words of a LinesWordsResult with their bounding boxes in screen coordinates. """
+	factor = getattr(imgInfo, "resizeFactor", 1) or 1
+	return [{
+	"text": word.get("text", ""),
+	"left": imgInfo.screenLeft+int(word["x"]/factor),
+	"top": imgInfo.screenTop+int(word["y"]/factor),
+	"width": int(word["width"]/factor),
+	"height": int(word["height"]/factor)}
+	for line in (getattr(result, "data", None) or []) for word in line]
+
+def writeSidecar(imagePath, kind, result, imgInfo, location, objectRole, objectName):
+	""" Writes the text recognized in a screenshot to a file with the same name as the image and the extension of kind, txt or json.
+	The text file has the rectangle and the reference object in its first lines, the json file also has the bounding box of each word.
+	Returns the path of the file. """
+	path = os.path.splitext(imagePath)[0]+sidecarExtensions[kind]
+	left, top, width, height = location
+	if kind == "json":
+		content = json.dumps({
+		"image": os.path.basename(imagePath),
+		"rectangle": {"left": left, "top": top, "width": width, "height": height},
+		"object": {"role": objectRole, "name": objectName},
+		"text": resultText(result),
+		"words": resultWords(result, imgInfo)}, ensure_ascii=False, indent=1)
+	else:
+		content = "{}\n{}, {}, {}, {}\n{} {}\n\n{}\n".format(os.path.basename(imagePath), left, top, width, height, objectRole, objectName, resultText(result))
+	with open(path, "w", encoding="utf-8") as f:
+		f.write(content)
+	return path
@@ -5,170 +5,264 @@ This file is covered by the GNU General Public License.
 Copyright (C) Javi Dominguez 2021
 """
 
-from threading import Event, Thread, Timer
-from logHandler import log
-import api
-import ctypes
-import locationHelper
-import os
-import screenBitmap
-import wx
+from .captureBackends import GDIBackend, LazyBackend
+from .imageOps import bgraToRGB
+from .watch import Watcher
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from time import perf_counter
+import weakref
+try:
+	from locationHelper import RectLTWH
+	from logHandler import log
+	import api
+except ImportError:
+	# Outside NVDA, for example with a SyntheticBackend. The desktop is then the framebuffer of the backend.
+	from .geometry import RectLTWH
+	import logging
+	log = logging.getLogger(__name__)
+	api = None
 
 EVT_object = "Rectangle.event_referenceObjectChanged"
 EVT_objectInside = "Rectangle.event_referenceObjectInsideFrame"
 EVT_objectOverflow = "Rectangle.event_referenceObjectOverflowFrame"
 EVT_insideWindow = "Rectangle.event_rectInsideWindow"
 EVT_overflowWindow = "Rectangle.event_rectOverflowWindow"
+EVT_pixelsChanged = "Rectangle.event_pixelsChanged"
+
+class ClipCache():
+	""" Remembers the locations of the objects already delimited by their containers, since each step of the walk is a cross-process call.
+	The entries are kept by object identity, expire after ttl seconds and are all discarded by invalidate,
+	which is called when the focus, the foreground window or the location of an object changes. """
+
+	def __init__(self, ttl=1.0, maxSize=64):
+		self.ttl = ttl
+		self.maxSize = maxSize
+		self.__entries = OrderedDict()
+		self.__lock = Lock()
+		self.hits = 0
+		self.misses = 0
+		# Number of container lookups avoided thanks to the cache.
+		self.lookupsSaved = 0
+
+	def get(self, obj):
+		with self.__lock:
+			entry = self.__entries.get(id(obj))
+			# The object is kept in the entry, so its id cannot be reused by another object while the entry exists.
+			if entry and entry[0] is obj and perf_counter()-entry[3] < self.ttl:
+				self.__entries.move_to_end(id(obj))
+				self.hits += 1
+				self.lookupsSaved += entry[2]
+				return entry[1]
+			self.misses += 1
+			return None
+
+	def put(self, obj, location, lookups):
+		with self.__lock:
+			self.__entries[id(obj)] = (obj, location, lookups, perf_counter())
+			self.__entries.move_to_end(id(obj))
+			while len(self.__entries) > self.maxSize:
+				self.__entries.popitem(last=False)
+
+	def invalidate(self):
+		with self.__lock:
+			self.__entries.clear()
+
+clipCache = ClipCache()
+
+def getDesktopLocation():
+	""" Location of the whole screen. Without NVDA, the framebuffer of the capture backend. """
+	if api: return api.getDesktopObject().location
+	return RectLTWH(0, 0, Rectangle.backend.width, Rectangle.backend.height)
 
 class Rectangle():
 	""" Class that defines a virtual rectangle on the screen.
 	This rectangle delimits the area of the screen from which a capture will be taken. """
 
+	# Number of times the screen has been grabbed, by any rectangle.
+	captureCount = 0
+	# Backend that takes the pixels, shared by all rectangles. It can be replaced by a SyntheticBackend to work without a Windows desktop.
+	backend = LazyBackend(GDIBackend)
+	# ObjectIndex of the visible objects, set while the wizard is open, so that the reference object can be found without hit testing.
+	objectIndex = None
+
 	def __init__(self, top=0, left=0, width=0, height=0):
-		self.__location = locationHelper.RectLTWH(top,left,width,height)
+		self.__location = RectLTWH(top,left,width,height)
 		self.__object = None
 		self.__events = {
 		EVT_object: Event(), # When the reference object changes
 		EVT_objectInside: Event(), # When the reference object goes inside the rectangle
 		EVT_objectOverflow: Event(), # When any part of the reference object is outside the rectangle
 		EVT_insideWindow: Event(), # When the rectangle is contained in the active foreground window
-		EVT_overflowWindow: Event() # When the rectangle sticks out of the active window in the foreground
+		EVT_overflowWindow: Event(), # When the rectangle sticks out of the active window in the foreground
+		EVT_pixelsChanged: Event() # When watching, the content of the rectangle has changed
 		}
 		self.__threads = set()
+		self.__session = None
+		self.__watcher = None
+		self.__stateWorker = None
 
 	def __del__(self):
-		while self.__threads:
-			self.__threads.pop().kill()
+		self.unbind()
+		self.closeSession()
+		self.stopWatching()
+		if self.__stateWorker: self.__stateWorker.kill()
 
 	def fromObject(self, obj):
 		if not hasattr(obj, "location"): raise TypeError("The argument must be an NVDA object")
-		if not isinstance(obj.location,locationHelper.RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
+		if not isinstance(obj.location,RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
 		self.__object = obj
 		self.__location = self.__delimit_object(obj)
 		return self
 
 	def getRGBQUAD_Array(self):
 		""" Returns a screenBitmap.RGBQUAD_Array object with the pixels that the rectangle contains. """
+		Rectangle.captureCount += 1
 		try:
-			# Set the mouse pointer to invisible mode
-			SPI_SETMOUSECURSOR = 0x0057
-			SPIF_SENDCHANGE = 0x02
-			transparentCursorFile = os.path.join(os.path.dirname(__file__), "TransparentCursor.cur")
-			ctypes.windll.user32.SystemParametersInfoW(SPI_SETMOUSECURSOR, 0, transparentCursorFile, SPIF_SENDCHANGE)
-			return screenBitmap.ScreenBitmap(self.__location.width, self.__location.height).captureImage(self.__location.top, self.__location.left, self.__location.width, self.__location.height)
+			# Within a session the buffers are reused, and only reallocated if the size of the rectangle has changed.
+			return (self.__session or self.backend).grab(self.__location)
 		except Exception as inst:
-			log.warning(Exception)
+			log.warning(inst)
 			return None
-		finally:
-			# Return the visible state to the mouse pointer.
-			Timer(1.0, ctypes.windll.user32.SystemParametersInfoW, (SPI_SETMOUSECURSOR, 1, 0, SPIF_SENDCHANGE)).start()
 
-	def getImage(self):
-		""" Returns a wx.Image object with the screen image delimited by the rectangle. """
+	def openSession(self):
+		""" Starts a capture session for burst shots. Until closeSession is called, the captures reuse the same buffers,
+		so each capture must be used before taking the next one. """
+		if not self.__session:
+			self.__session = self.backend.openSession()
+		return self.__session
+
+	def closeSession(self):
+		if self.__session:
+			self.__session.close()
+			self.__session = None
+
+	def startWatching(self, interval=0.5):
+		""" Starts polling the screen every interval seconds. Each time the pixels of the rectangle change, EVT_pixelsChanged is set
+		and the new frame can be taken from the watcher with getChangedCapture. """
+		if self.__watcher: return
+		self.__watcher = Watcher(self.backend, self.__location, interval, self.__events[EVT_pixelsChanged])
+		self.__watcher.start()
+
+	def stopWatching(self):
+		if self.__watcher:
+			self.__watcher.stop()
+			self.__watcher = None
+
+	def getChangedCapture(self):
+		""" Returns a Capture object with the last frame that was detected as changed, or None. """
+		if not self.__watcher or not self.__watcher.frame: return None
+		return Capture(self.__watcher.frame, self.__watcher.location)
+
+	@property
+	def watcher(self):
+		return self.__watcher
+
+	def capture(self):
+		""" Grabs the screen once and returns a Capture object that can be shared by the clipboard, save and OCR commands.
+		Returns None if the screen could not be captured. """
 		rgb = self.getRGBQUAD_Array()
 		if not rgb: return None
-		return wx.BitmapFromBufferRGBA(self.__location.width, self.__location.height, rgb).ConvertToImage()
+		return Capture(rgb, self.__location)
+
+	def getImage(self):
+		""" Returns a wx.Image object with the screen image delimited by the rectangle. """
+		capture = self.capture()
+		if not capture: return None
+		return capture.getImage()
 
 	def moveLeftEdge(self, step=1):
-		check = self.__check_overflows()
+		self.__check_overflows()
 		x, y, w, h = self.__location
 		x = x+step
 		w = w+(-1*step)
 		if x<0:
-			check.set()
 			return None
 		if x > self.__location.right-10:
-			check.set()
 			return None
-		self.__location = locationHelper.RectLTWH(x, y, w, h)
-		check.set()
+		self.__location = RectLTWH(x, y, w, h)
 		self.__hook_object()
+		self.__moved()
 		return x
 
 	def moveRightEdge(self, step=1):
-		check = self.__check_overflows()
+		self.__check_overflows()
 		x, y, w, h = self.__location
 		w = w+step
-		if x+w > api.getDesktopObject().location.width:
-			check.set()
+		if x+w > getDesktopLocation().width:
 			return None
 		if w < 10:
-			check.set()
 			return None
-		self.__location = locationHelper.RectLTWH(x, y, w, h)
-		check.set()
+		self.__location = RectLTWH(x, y, w, h)
 		self.__hook_object()
+		self.__moved()
 		return x+w
 
 	def moveTopEdge(self, step=1):
-		check = self.__check_overflows()
+		self.__check_overflows()
 		x, y, w, h = self.__location
 		y = y+step
 		h = h+(-1*step)
 		if y < 0:
-			check.set()
 			return None
 		if y > self.__location.bottom-10:
-			check.set()
 			return None
-		self.__location = locationHelper.RectLTWH(x,y,w,h)
-		check.set()
+		self.__location = RectLTWH(x,y,w,h)
 		self.__hook_object()
+		self.__moved()
 		return y
 
 	def moveBottomEdge(self, step=1):
-		check = self.__check_overflows()
+		self.__check_overflows()
 		x, y, w, h = self.__location
 		h = h+step
 		if h < 10:
-			check.set()
 			return None
-		if y+h > api.getDesktopObject().location.height:
-			check.set()
+		if y+h > getDesktopLocation().height:
 			return None
-		self.__location = locationHelper.RectLTWH(x, y, w, h)
-		check.set()
+		self.__location = RectLTWH(x, y, w, h)
 		self.__hook_object()
+		self.__moved()
 		return y+h
 
 	def expandOrShrink(self, step=1):
-		check = self.__check_overflows()
+		self.__check_overflows()
 		try:
-			location = api.getDesktopObject().location.intersection(self.__location.expandOrShrink(step))
+			location = getDesktopLocation().intersection(self.__location.expandOrShrink(step))
 		except:
-			check.set()
 			return False
 		if location.width < 10 or location.height < 10:
-			check.set()
 			return False
 		elif location == self.__location:
-			check.set()
 			return False
 		else:
 			self.__location = location
-			check.set()
+			self.__moved()
 			return True
 
 	def ratioObjectFrame(self, obj):
 		if not hasattr(obj, "location"): raise TypeError("The argument must be an NVDA object")
-		if not isinstance(obj.location,locationHelper.RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
+		if not isinstance(obj.location,RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
 		objloc = self.__location.intersection(self.__delimit_object(obj))
 		return (objloc.width*objloc.height)/(self.__location.width*self.__location.height) if self.__location.width*self.__location.height > 0 else 0
 
 	def ratioFrameObject(self, obj):
 		if not hasattr(obj, "location"): raise TypeError("The argument must be an NVDA object")
-		if not isinstance(obj.location,locationHelper.RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
+		if not isinstance(obj.location,RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
 		objloc = self.__delimit_object(obj)
 		return (self.__location.width*self.__location.height)/(objloc.width*objloc.height)
 
 	def isObjectInsideRectangle(self, obj=None):
 		if not obj: obj = self.__object
 		if not hasattr(obj, "location"): raise TypeError("The argument must be an NVDA object")
-		if not isinstance(obj.location,locationHelper.RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
+		if not isinstance(obj.location,RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
 		return self.__location.isSuperset(self.__delimit_object(obj))
 
-	def isRectangleInsideTheWindow(self):
-		return self.__delimit_object(api.getForegroundObject()).isSuperset(self.__location)
+	def isRectangleInsideTheWindow(self, window=None):
+		if not window:
+			if not api: return getDesktopLocation().isSuperset(self.__location)
+			window = api.getForegroundObject()
+		return self.__delimit_object(window).isSuperset(self.__location)
 
 	def adjustToObject(self):
 		if not self.__object: return False
@@ -185,11 +279,21 @@ class Rectangle():
 		thread.start()
 		self.__threads.add(thread)
 
+	def unbind(self, event=None):
+		""" Stops the functions bound to event, or to all the events if no event is given.
+		The handlers hold the arguments they were bound with, so a rectangle passed to its own handler is not released until they are stopped. """
+		for thread in [thread for thread in self.__threads if event is None or thread.name == event]:
+			self.__threads.discard(thread)
+			thread.kill()
+
 	def __hook_object(self):
 		""" Find the most appropriate object to be the reference object for the rectangle.
 		It will be the most centered object, in the foreground and occupying a larger area. """
 		x, y = self.__location.center
-		obj = api.getDesktopObject().objectFromPoint(x,y)
+		# An incomplete index lacks the deepest objects of large windows, it would give their containers.
+		obj = self.objectIndex.objectAt(x, y) if self.objectIndex and self.objectIndex.complete else None
+		if not obj and api: obj = api.getDesktopObject().objectFromPoint(x,y)
+		if not obj: return
 		if not self.__object or (
 		obj != self.__object and\
 		self.ratioObjectFrame(obj) >= self.ratioObjectFrame(self.__object)) or (
@@ -202,40 +306,31 @@ class Rectangle():
 		The part that is outside these limits will most likely not be displayed on the screen..
 		Returns an object locationHelper.RectLTWH. """
 		if not hasattr(obj, "location"): raise TypeError("The argument must be an NVDA object")
-		if not isinstance(obj.location,locationHelper.RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
+		if not isinstance(obj.location,RectLTWH): raise TypeError("The location attribute must be a RectLTWH object")
+		cached = clipCache.get(obj)
+		if cached is not None: return cached
+		original = obj
 		location = obj.location
+		lookups = 0
 		while obj:
 			obj = obj.container
+			lookups += 1
 			if obj and hasattr(obj, "location") and obj.location != (0,0,0,0):
 				location = location.intersection(obj.location)
+		clipCache.put(original, location, lookups)
 		return location
 
 	def __check_overflows(self):
-		""" Save the state of the object and the window with respect to the rectangle,
-		then it starts a thread that will wait for the termination of the method that called it, when it receives the signal it will check if the states have changed and it will set the corresponding events.
-		Returns an event that is received by the method that called it, which will set it when necessary which will send the signal to start the thread. """
-		ev = Event()
-		obj = self.__object
-		insideObject = self.isObjectInsideRectangle()
-		insideWindow = self.isRectangleInsideTheWindow()
-		def check():
-			ev.wait(1.0)
-			if not ev.isSet:
-			# If it get here because  timeout was exceeded, it exits without doing anything.
-				return
-			if self.__object != obj: return
-			curInsideObject = self.isObjectInsideRectangle()
-			if (insideObject, curInsideObject) == (True, False):
-				self.__events[EVT_objectOverflow].set()
-			elif (insideObject, curInsideObject) == (False, True):
-				self.__events[EVT_objectInside].set()
-			curInsideWindow = self.isRectangleInsideTheWindow()
-			if (insideWindow, curInsideWindow) == (True, False):
-				self.__events[EVT_overflowWindow].set()
-			elif (insideWindow, curInsideWindow) == (False, True):
-				self.__events[EVT_insideWindow].set()
-		Thread(target=check).start()
-		return ev
+		""" Called before moving the rectangle. It saves the state of the object and the window with respect to the rectangle,
+		unless the rectangle is still moving, and the worker will compare it with the state reached after the moves. """
+		if not self.__stateWorker:
+			self.__stateWorker = StateWorker(self, self.__events)
+			self.__stateWorker.start()
+		self.__stateWorker.beforeMove(self)
+
+	def __moved(self):
+		""" Notifies the state worker that the rectangle has moved. """
+		self.__stateWorker.notify()
 
 	@property
 	def object(self):
@@ -285,6 +380,116 @@ class Rectangle():
 	def bottomRight(self):
 		return self.__location.bottomRight
 
+class Capture():
+	""" The pixels of a rectangle taken from the screen at a given moment. """
+
+	def __init__(self, buffer, location):
+		self.__buffer = buffer
+		self.__location = location
+		self.__image = None
+
+	def getImage(self):
+		""" Returns a wx.Image object with the captured pixels. It is built only once.
+		The BGRA pixels are converted to RGB in a single copy which the image uses directly, without going through a wx.Bitmap. """
+		if self.__image is None:
+			import wx
+			rgb = bgraToRGB(self.__buffer, self.__location.width, self.__location.height)
+			self.__image = wx.ImageFromBuffer(self.__location.width, self.__location.height, rgb)
+		return self.__image
+
+	@property
+	def buffer(self):
+		return self.__buffer
+
+	@property
+	def location(self):
+		return self.__location
+
+	@property
+	def width(self):
+		return self.__location.width
+
+	@property
+	def height(self):
+		return self.__location.height
+
+class StateWorker(Thread):
+	""" Thread that follows the state of the reference object and the active window with respect to a rectangle.
+	Moves are coalesced: the state is saved before the first of a series of moves and checked only when the rectangle has stopped moving for settleTime seconds,
+	then the events of the transitions between both states are set. """
+
+	settleTime = 0.1
+
+	def __init__(self, rectangle, events):
+		# Weak reference, so that the thread does not keep the rectangle alive.
+		self.__rectangle = weakref.ref(rectangle)
+		self.__events = events
+		self.__moved = Event()
+		self.__flag = True
+		self.__state = None
+		# True while no moves are waiting to be checked.
+		self.__settled = True
+		self.__lock = Lock()
+		super(StateWorker, self).__init__()
+		self.daemon = True
+		self.name = "screenshots.StateWorker"
+
+	def __getState(self, rectangle):
+		return (rectangle.object, rectangle.isObjectInsideRectangle(), rectangle.isRectangleInsideTheWindow())
+
+	def beforeMove(self, rectangle):
+		""" Saves the state before a move, if the previous moves have already been checked.
+		The rectangle may have changed without moving since then, for example when it is adjusted to the object. """
+		with self.__lock:
+			if self.__settled:
+				self.__state = self.__getState(rectangle)
+				self.__settled = False
+		# The move may be refused, the check will find the same state then.
+		self.__moved.set()
+
+	def notify(self):
+		self.__moved.set()
+
+	def run(self):
+		while self.__flag:
+			self.__moved.wait()
+			self.__moved.clear()
+			# Wait until the moves stop
+			while self.__flag and self.__moved.wait(self.settleTime):
+				self.__moved.clear()
+			rectangle = self.__rectangle()
+			if not self.__flag or not rectangle: return
+			try:
+				self.__check(rectangle)
+			except Exception:
+				log.debugWarning("Error checking the rectangle state", exc_info=True)
+			del rectangle
+
+	def __check(self, rectangle):
+		# A move that starts meanwhile waits for this check, so that its state is saved after it.
+		with self.__lock:
+			try:
+				previous, current = self.__state, self.__getState(rectangle)
+			finally:
+				self.__settled = True
+		if not previous: return
+		obj, insideObject, insideWindow = previous
+		curObj, curInsideObject, curInsideWindow = current
+		# If the reference object has changed, the comparison makes no sense. The change of object is notified by its own event.
+		if curObj != obj: return
+		if (insideObject, curInsideObject) == (True, False):
+			self.__events[EVT_objectOverflow].set()
+		elif (insideObject, curInsideObject) == (False, True):
+			self.__events[EVT_objectInside].set()
+		if (insideWindow, curInsideWindow) == (True, False):
+			self.__events[EVT_overflowWindow].set()
+		elif (insideWindow, curInsideWindow) == (False, True):
+			self.__events[EVT_insideWindow].set()
+
+	def kill(self):
+		self.__flag = False
+		self.__moved.set()
+
 class EventHandler(Thread):
 	""" Thread that listens for an event and executes a function each time it receives the signal. """
 
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Index of the saved screenshots for the screenshots wizard NVDA addon.
+Keeps the text recognized in each screenshot and its metadata in a SQLite database, so that past screenshots can be found by their text,
+and the hash of the pixels of each screenshot with the size and time of its file, so that identical screenshots are not saved twice.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from datetime import datetime
+from hashlib import blake2b
+from threading import Lock
+import os
+import re
+# Imported by loadSqlite on the first use of an index, it is not needed at NVDA startup.
+sqlite3 = None
+
+def loadSqlite():
+	""" Imports sqlite3, returns the module or False if it is not available, in which case the screenshots are not indexed. """
+	global sqlite3
+	if sqlite3 is None:
+		try:
+			import sqlite3 as module
+		except ImportError:
+			module = False
+		sqlite3 = module
+	return sqlite3
+
+def contentKey(pixels, *parameters):
+	""" Hash of the pixels of a capture and of the parameters that change the file where it is saved, such as the format or the scale. """
+	key = blake2b(memoryview(pixels).cast("B"), digest_size=20)
+	key.update(repr(parameters).encode("utf-8"))
+	return key.hexdigest()
+
+class ScreenshotIndex():
+	""" Full text index of the screenshots, stored in the database file at path.
+	It uses a FTS5 table when SQLite has been built with it, otherwise a normal table searched with LIKE, which is slower but finds the same.
+	It can be updated from any thread. """
+
+	def __init__(self, path):
+		self.path = path
+		self.fullText = False
+		self.__connection = None
+		self.__lock = Lock()
+
+	@property
+	def available(self):
+		return bool(loadSqlite())
+
+	def __connect(self):
+		if self.__connection: return self.__connection
+		connection = sqlite3.connect(self.path, check_same_thread=False)
+		try:
+			connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS screenshots USING fts5(path UNINDEXED, saved UNINDEXED, rectangle UNINDEXED, role, name, text, tokenize='unicode61 remove_diacritics 2')")
+			self.fullText = True
+		except sqlite3.OperationalError:
+			connection.execute("CREATE TABLE IF NOT EXISTS screenshots (path TEXT PRIMARY KEY, saved TEXT, rectangle TEXT, role TEXT, name TEXT, text TEXT)")
+		columns = [row[1] for row in connection.execute("PRAGMA table_info(contents)")]
+		if columns and "mtime" not in columns:
+			# Created by a previous version, without the size and time of the files. It only avoids saving duplicates, it can be rebuilt.
+			connection.execute("DROP TABLE contents")
+		connection.execute("CREATE TABLE IF NOT EXISTS contents (key TEXT PRIMARY KEY, path TEXT, size INTEGER, mtime INTEGER) WITHOUT ROWID")
+		connection.execute("CREATE INDEX IF NOT EXISTS contentsPath ON contents (path)")
+		connection.commit()
+		self.__connection = connection
+		return connection
+
+	def add(self, path, location, objectRole="", objectName="", text="", saved=None):
+		""" Indexes the screenshot saved at path, or indexes it again with the new data if it was already indexed. """
+		if not self.available: return
+		path = os.path.abspath(path)
+		saved = (saved if saved else datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+		rectangle = "{}, {}, {}, {}".format(*location)
+		with self.__lock:
+			connection = self.__connect()
+			connection.execute("DELETE FROM screenshots WHERE path = ?", (path, ))
+			connection.execute("INSERT INTO screenshots (path, saved, rectangle, role, name, text) VALUES (?, ?, ?, ?, ?, ?)",
+			(path, saved, rectangle, objectRole, objectName, text))
+			connection.commit()
+
+	def setText(self, path, text):
+		""" Adds the recognized text to a screenshot already indexed. """
+		if not self.available: return
+		with self.__lock:
+			connection = self.__connect()
+			connection.execute("UPDATE screenshots SET text = ? WHERE path = ?", (text, os.path.abspath(path)))
+			connection.commit()
+
+	def remove(self, path):
+		if not self.available: return
+		with self.__lock:
+			connection = self.__connect()
+			connection.execute("DELETE FROM screenshots WHERE path = ?", (os.path.abspath(path), ))
+			connection.commit()
+
+	def addContent(self, key, path):
+		""" Records that the screenshot just saved at path has the contentKey key. Any other key of the same path is forgotten, its file has been replaced. """
+		if not self.available: return
+		path = os.path.abspath(path)
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return
+		with self.__lock:
+			connection = self.__connect()
+			connection.execute("DELETE FROM contents WHERE path = ?", (path, ))
+			connection.execute("INSERT OR REPLACE INTO contents (key, path, size, mtime) VALUES (?, ?, ?, ?)", (key, path, stat.st_size, stat.st_mtime_ns))
+			connection.commit()
+
+	def findContent(self, key):
+		""" Returns the path of a saved screenshot with the contentKey key, or None.
+		Files that no longer exist, or whose size or modification time have changed since they were saved, are forgotten. """
+		if not self.available: return None
+		with self.__lock:
+			connection = self.__connect()
+			row = connection.execute("SELECT path, size, mtime FROM contents WHERE key = ?", (key, )).fetchone()
+			if not row: return None
+			try:
+				stat = os.stat(row[0])
+				if (stat.st_size, stat.st_mtime_ns) == (row[1], row[2]): return row[0]
+			except OSError:
+				pass
+			connection.execute("DELETE FROM contents WHERE key = ?", (key, ))
+			connection.commit()
+		return None
+
+	def search(self, query, limit=50):
+		""" Returns a list of (path, saved, rectangle, role, name, text) of the screenshots that contain all the words of query,
+		the best matches first with the full text index, the most recent first without it. """
+		words = re.findall(r"\w+", query)
+		if not self.available or not words: return []
+		with self.__lock:
+			connection = self.__connect()
+			if self.fullText:
+				# Each word is quoted so that the query syntax of FTS5 does not apply, and matches as a prefix.
+				match = " ".join("\"{}\"*".format(word) for word in words)
+				return connection.execute("SELECT path, saved, rectangle, role, name, text FROM screenshots WHERE screenshots MATCH ? ORDER BY rank LIMIT ?",
+				(match, limit)).fetchall()
+			condition = " AND ".join(["(role || ' ' || name || ' ' || text) LIKE ?"]*len(words))
+			return connection.execute("SELECT path, saved, rectangle, role, name, text FROM screenshots WHERE {} ORDER BY saved DESC LIMIT ?".format(condition),
+			["%{}%".format(word) for word in words]+[limit]).fetchall()
+
+	def __len__(self):
+		if not self.available: return 0
+		with self.__lock:
+			return self.__connect().execute("SELECT count(*) FROM screenshots").fetchone()[0]
+
+	def close(self):
+		with self.__lock:
+			if self.__connection: self.__connection.close()
+			self.__connection = None
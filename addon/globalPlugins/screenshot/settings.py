@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Settings of the screenshots wizard NVDA addon.
+The values of the screenshots section of the normal configuration profile are read through configobj only when they change,
+and kept as typed attributes of the settings object, so that scripts read them without parsing strings on each key press.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+import re
+
+confspec = {
+	"folder":"string(default=/)",
+	"format":"option(\"BMP\", \"JPG\", \"GIF\", \"PNG\", \"TIFF\", default=\"PNG\")",
+	"action":"integer(default=2, min=0, max=2)",
+	"step":"integer(default=5, min=1, max=10)",
+	"scale":"boolean(default=false)",
+	"scaleMethod":"string(default=nearest)",
+	"encoderPreset":"string(default=normal)",
+	"pngCompression":"integer(default=6, min=0, max=9)",
+	"pngFilter":"string(default=auto)",
+	"jpegQuality":"integer(default=90, min=1, max=100)",
+	"tiffCompression":"string(default=lzw)",
+	"burstCount":"integer(default=10, min=2, max=1000)",
+	"burstInterval":"integer(default=500, min=0, max=60000)",
+	"watchInterval":"integer(default=500, min=100, max=60000)",
+	"sidecar":"string(default=none)",
+	"indexText":"boolean(default=false)"
+}
+
+def parseSpec(spec):
+	""" Returns (type, default, minimum, maximum, choices) of a value of confspec, such as "integer(default=5, min=1, max=10)".
+	choices are the values allowed by an option spec, or None. """
+	kind, args = re.match(r"(\w+)\((.*)\)$", spec).groups()
+	args = [arg.strip().strip("\"") if "=" not in arg else arg for arg in args.split(",")]
+	choices = [arg for arg in args if "=" not in arg] if kind == "option" else None
+	args = dict((name.strip(), value.strip().strip("\"")) for name, value in (arg.split("=", 1) for arg in args if "=" in arg))
+	convert = {"integer": int, "boolean": toBool}.get(kind, str)
+	return (convert, convert(args["default"]),
+	int(args["min"]) if "min" in args else None,
+	int(args["max"]) if "max" in args else None,
+	choices)
+
+def toBool(value):
+	""" configobj gives the booleans of the profiles as strings until they are validated. """
+	if isinstance(value, str): return value.strip().lower() in ("true", "yes", "on", "1")
+	return bool(value)
+
+class Settings():
+	""" Typed copy of the screenshots settings, one attribute for each key of confspec: settings.step is an int, settings.scale a bool...
+	Values that cannot be converted, or that are not among the choices of an option, take their default, and numbers are limited to the range of the spec.
+	load reads them again from the configuration, and set changes one of them both here and in the configuration.
+	Functions registered with register are called with the settings object after every change. """
+
+	def __init__(self, spec):
+		self.__specs = dict((key, parseSpec(value)) for key, value in spec.items())
+		self.__listeners = []
+		self.loads = 0
+		for key, spec in self.__specs.items():
+			setattr(self, key, spec[1])
+
+	def validate(self, key, value):
+		convert, default, minimum, maximum, choices = self.__specs[key]
+		try:
+			value = convert(value)
+		except (TypeError, ValueError):
+			return default
+		if choices is not None and value not in choices: return default
+		if minimum is not None and value < minimum: value = minimum
+		if maximum is not None and value > maximum: value = maximum
+		return value
+
+	def load(self, section=None, *args, **kwargs):
+		""" Reads all the values from section, by default the screenshots section of the normal profile.
+		It also receives the arguments of the config extension points it is registered with, which are ignored. """
+		if section is None or not hasattr(section, "get"):
+			import config
+			section = config.conf.profiles[0].get("screenshots", {})
+		for key, spec in self.__specs.items():
+			setattr(self, key, self.validate(key, section.get(key, spec[1])))
+		self.loads += 1
+		self.__notify()
+
+	def set(self, key, value, section=None):
+		""" Changes a value, which is validated and written to section, by default the screenshots section of the normal profile. """
+		if key not in self.__specs: raise KeyError(key)
+		value = self.validate(key, value)
+		if section is None:
+			import config
+			section = config.conf.profiles[0]["screenshots"]
+		section[key] = value
+		if getattr(self, key) != value:
+			setattr(self, key, value)
+			self.__notify()
+
+	def register(self, func):
+		if func not in self.__listeners: self.__listeners.append(func)
+
+	def unregister(self, func):
+		if func in self.__listeners: self.__listeners.remove(func)
+
+	def __notify(self):
+		for func in list(self.__listeners):
+			func(self)
+
+	def __getitem__(self, key):
+		# So that the settings can be passed where a configuration section was expected, as to encoders.getEncoderOptions.
+		if key not in self.__specs: raise KeyError(key)
+		return getattr(self, key)
+
+	def __contains__(self, key):
+		return key in self.__specs
+
+	def __iter__(self):
+		return iter(self.__specs)
+
+settings = Settings(confspec)
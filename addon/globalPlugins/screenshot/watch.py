@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Change detection for the screenshots wizard NVDA addon.
+Polls an area of the screen and signals when its pixels change.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from threading import Event, Thread
+from zlib import crc32
+
+def blockHashes(buffer, width, blockRows=16):
+	""" Splits a BGRA buffer into bands of blockRows rows and returns a list with the CRC32 of each band.
+	The checksums are computed by zlib over the raw memory, so it is fast enough for full screen polling. """
+	data = memoryview(buffer).cast("B")
+	bandSize = width*4*blockRows
+	return [crc32(data[start:start+bandSize]) for start in range(0, len(data), bandSize)]
+
+def changedBands(previous, current):
+	""" Returns the indexes of the bands whose checksum differs. """
+	if len(previous) != len(current): return list(range(len(current)))
+	return [i for i, (a, b) in enumerate(zip(previous, current)) if a != b]
+
+class Watcher(Thread):
+	""" Thread that captures location every interval seconds through a session of the backend.
+	When the pixels differ from the previous capture, it keeps a copy of the new frame and sets the event. """
+
+	def __init__(self, backend, location, interval, event, blockRows=16):
+		super(Watcher, self).__init__()
+		self.daemon = True
+		self.name = "screenshots.Watcher"
+		self.backend = backend
+		self.location = location
+		self.interval = interval
+		self.blockRows = blockRows
+		self.frame = None
+		self.changedRows = None
+		self.changes = 0
+		self.polls = 0
+		self.__event = event
+		self.__stop = Event()
+
+	def run(self):
+		# The watch can last for hours, the mouse pointer is hidden only around each capture and not for the whole session.
+		session = self.backend.openSession(holdCursor=False)
+		previous = None
+		try:
+			while not self.__stop.is_set():
+				try:
+					buffer = session.grab(self.location)
+				except Exception:
+					buffer = None
+				if buffer:
+					self.polls += 1
+					current = blockHashes(buffer, self.location.width, self.blockRows)
+					bands = changedBands(previous, current) if previous is not None else []
+					previous = current
+					if bands:
+						# Rows of the rectangle that have changed, from the first changed band to the end of the last one.
+						self.changedRows = (bands[0]*self.blockRows, min((bands[-1]+1)*self.blockRows, self.location.height))
+						self.frame = bytearray(memoryview(buffer).cast("B"))
+						self.changes += 1
+						self.__event.set()
+				self.__stop.wait(self.interval)
+		finally:
+			session.close()
+
+	def stop(self):
+		self.__stop.set()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Background writer for the screenshots wizard NVDA addon.
+Scaling, encoding and writing the image files are done in a worker thread so that NVDA keeps speaking while a large screenshot is saved.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from queue import Queue, Full
+from threading import Thread
+try:
+	from logHandler import log
+except ImportError:
+	# Outside NVDA, for example when the queue is exercised with fake images.
+	import logging
+	log = logging.getLogger(__name__)
+
+class SaveJob():
+	""" An image waiting to be written to disk.
+	image is any object with a SaveFile(path) method, such as wx.Image.
+	transform, if given, receives the image in the worker thread and returns the image to be saved (scaling, etc.)
+	onDone will be called with the job and a boolean that indicates if the file was written.
+	options are the wx.Image options of the encoder, such as the compression level. """
+
+	def __init__(self, image, path, transform=None, onDone=None, options=None):
+		self.image = image
+		self.path = path
+		self.transform = transform
+		self.onDone = onDone
+		# Encoder options, they are set with image.SetOption before saving.
+		self.options = options if options else {}
+		self.error = None
+
+class ImageWriter(Thread):
+	""" Thread that takes save jobs from a bounded queue and writes them one by one.
+	When the queue is full, submit will refuse new jobs, so the user can be told to wait instead of piling up images in memory. """
+
+	def __init__(self, maxPending=4, save=None, dispatch=None):
+		""" save is the function that writes an image to a path and returns True on success. By default image.SaveFile(path).
+		dispatch is the function used to run the onDone callbacks, for example wx.CallAfter to run them in the main thread. By default they run in the worker thread. """
+		super(ImageWriter, self).__init__()
+		self.daemon = True
+		self.name = "screenshots.ImageWriter"
+		self.__queue = Queue(maxPending)
+		self.__save = save if save else lambda image, path: image.SaveFile(path)
+		self.__dispatch = dispatch if dispatch else lambda func, *args: func(*args)
+		self.__flag = True
+
+	def submit(self, job, timeout=0):
+		""" Queues a job. Waits up to timeout seconds if the queue is full.
+		Returns False if the job could not be queued. """
+		if not self.__flag: return False
+		try:
+			self.__queue.put(job, block=timeout>0, timeout=timeout if timeout>0 else None)
+		except Full:
+			return False
+		return True
+
+	def run(self):
+		while True:
+			job = self.__queue.get()
+			try:
+				if job is None: return
+				self.__process(job)
+			finally:
+				self.__queue.task_done()
+
+	def __process(self, job):
+		try:
+			image = job.transform(job.image) if job.transform else job.image
+			for name, value in job.options.items():
+				image.SetOption(name, value)
+			done = bool(self.__save(image, job.path))
+		except Exception as inst:
+			log.error("Unable to save screenshot {}".format(job.path), exc_info=True)
+			job.error = inst
+			done = False
+		# Release the pixels as soon as possible, there may be other jobs waiting.
+		job.image = None
+		if job.onDone:
+			self.__dispatch(job.onDone, job, done)
+
+	def waitPending(self):
+		""" Blocks until all queued jobs have been processed. """
+		self.__queue.join()
+
+	def stop(self):
+		""" Finishes the pending jobs and ends the thread. """
+		if not self.__flag: return
+		self.__flag = False
+		self.__queue.put(None)
+
+	@property
+	def pending(self):
+		return self.__queue.qsize()
+
+	@property
+	def maxPending(self):
+		return self.__queue.maxsize
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Benchmarks of the screenshots wizard NVDA addon.
+They run outside NVDA, with any Python 3: python tests/benchmarks.py
+They are not part of the addon package, since they allocate buffers of the size of whole screens.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+# Registers the modules of the addon as the screenshot package, as for the tests.
+import conftest
+from screenshot.captureBackends import SyntheticBackend
+from screenshot.geometry import RectLTWH
+from screenshot.encoders import OPTION_PNG_COMPRESSION_LEVEL, PNGWriter, getEncoderOptions
+from screenshot.imageOps import bgraToRGB, scaleNearest
+from screenshot.searchIndex import ScreenshotIndex, loadSqlite
+from time import perf_counter
+import os
+import tempfile
+
+def syntheticUI(width, height):
+	""" Returns the RGB pixels of an image that looks like a user interface: flat background, framed panels and lines of text-like marks. """
+	rgb = bytearray(b"\xf0\xf0\xf0"*(width*height))
+	rowSize = width*3
+	for y in range(height):
+		row = y*rowSize
+		if y%120 in (0, 1):
+			# Frame of the panels
+			rgb[row:row+rowSize] = b"\x80\x80\x80"*width
+		elif 20 <= y%30 <= 28:
+			# Text: short dark marks separated by spaces
+			for x in range(8+(y%7), width-8, 9):
+				rgb[row+x*3:row+x*3+6] = b"\x10\x10\x10"*2
+	return rgb
+
+def capture(backend, location, shots=20):
+	""" Takes the given number of shots of location, first one by one and then within a session.
+	Returns a dictionary with the allocations and the average seconds per shot of each mode. """
+	results = {}
+	for mode in ("single", "session"):
+		backend.captures, backend.allocations, backend.totalTime = 0, 0, 0.0
+		if mode == "session":
+			session = backend.openSession()
+			for i in range(shots): session.grab(location)
+			session.close()
+		else:
+			for i in range(shots): backend.grab(location)
+		results[mode] = {"allocations": backend.allocations, "averageTime": backend.averageTime}
+	return results
+
+def conversion(width=3840, height=2160):
+	""" Converts a synthetic BGRA capture of the given size.
+	Returns a dictionary with the seconds spent and the peak of memory allocated during the conversion, in bytes, next to the size of the capture. """
+	import tracemalloc
+	buffer = bytearray(width*height*4)
+	tracemalloc.start()
+	try:
+		start = perf_counter()
+		rgb = bgraToRGB(buffer, width, height)
+		elapsed = perf_counter()-start
+		current, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return {"time": elapsed, "peakBytes": peak, "captureBytes": len(buffer), "imageBytes": len(rgb)}
+
+def scaling(width=960, height=540, factor=2):
+	""" Enlarges a synthetic image with UI-like content by each scaling method, and saves it as PNG.
+	Returns a dictionary with the seconds spent scaling and the bytes of the file for each method. The wx method is measured only if wx is available. """
+	rgb = syntheticUI(width, height)
+	methods = {"nearest": lambda: scaleNearest(rgb, width, height, factor)}
+	try:
+		import wx
+		image = wx.ImageFromBuffer(width, height, rgb)
+		methods["smooth"] = lambda: image.Scale(width*factor, height*factor, wx.IMAGE_QUALITY_HIGH).GetData()
+	except ImportError:
+		pass
+	results = {}
+	for name, method in methods.items():
+		start = perf_counter()
+		scaled = method()
+		elapsed = perf_counter()-start
+		path = os.path.join(tempfile.gettempdir(), "screenshotsScaling.png")
+		writer = PNGWriter(path, width*factor, height*factor)
+		writer.writeRows(scaled)
+		writer.close()
+		results[name] = {"time": elapsed, "bytes": os.path.getsize(path)}
+		os.remove(path)
+	return results
+
+def encoding(width=1920, height=1080):
+	""" Saves a synthetic image with UI-like content in every format, with the normal settings and with the fast preset.
+	Returns a list of rows (format, preset, seconds, bytes). The wx encoders are measured only if wx is available, the streaming PNG writer always. """
+	rgb = syntheticUI(width, height)
+	normal = {"encoderPreset": "normal", "pngCompression": 6, "pngFilter": "auto", "jpegQuality": 90, "tiffCompression": "lzw"}
+	path = os.path.join(tempfile.gettempdir(), "screenshotsEncoding")
+	results = []
+	for preset, settings in (("normal", normal), ("fast", dict(normal, encoderPreset="fast"))):
+		options = getEncoderOptions("PNG", settings)
+		start = perf_counter()
+		writer = PNGWriter(path, width, height, options[OPTION_PNG_COMPRESSION_LEVEL])
+		writer.writeRows(rgb)
+		writer.close()
+		results.append(("PNG (streaming)", preset, perf_counter()-start, os.path.getsize(path)))
+		try:
+			import wx
+		except ImportError:
+			continue
+		for format in ("BMP", "JPG", "GIF", "PNG", "TIFF"):
+			image = wx.ImageFromBuffer(width, height, rgb)
+			for name, value in getEncoderOptions(format, settings).items():
+				image.SetOption(name, value)
+			start = perf_counter()
+			image.SaveFile(path+"."+format.lower())
+			results.append((format, preset, perf_counter()-start, os.path.getsize(path+"."+format.lower())))
+			os.remove(path+"."+format.lower())
+	os.remove(path)
+	return results
+
+def search(path, entries=20000, queries=100):
+	""" Fills an index at path with entries of synthetic text and returns the average seconds per search. """
+	from random import Random
+	random = Random(1)
+	vocabulary = ["word{}".format(i) for i in range(5000)]
+	index = ScreenshotIndex(path)
+	connection = loadSqlite().connect(path)
+	index.add("warmup", (0, 0, 1, 1))
+	connection.executemany("INSERT INTO screenshots (path, saved, rectangle, role, name, text) VALUES (?, ?, ?, ?, ?, ?)",
+	[("shot{}.png".format(i), "2021-01-01 00:00:00", "0, 0, 100, 100", "window", "", " ".join(random.choice(vocabulary) for w in range(60)))
+	for i in range(entries)])
+	connection.commit()
+	connection.close()
+	start = perf_counter()
+	for i in range(queries):
+		index.search("{} {}".format(random.choice(vocabulary), random.choice(vocabulary)))
+	elapsed = (perf_counter()-start)/queries
+	index.close()
+	return {"fullText": index.fullText, "entries": entries, "averageTime": elapsed}
+
+if __name__ == "__main__":
+	for mode, result in capture(SyntheticBackend(1920, 1080), RectLTWH(0, 0, 1920, 1080)).items():
+		print("Capture 1920x1080, {}: {} allocations, {:.2f} ms per shot".format(mode, result["allocations"], result["averageTime"]*1000))
+	result = conversion()
+	print("Conversion 3840x2160 to RGB: {:.0f} ms, peak {:.1f} MB for an image of {:.1f} MB".format(result["time"]*1000, result["peakBytes"]/1e6, result["imageBytes"]/1e6))
+	for method, result in scaling().items():
+		print("Scaling 960x540 2x, {}: {:.0f} ms, {} bytes as PNG".format(method, result["time"]*1000, result["bytes"]))
+	for format, preset, seconds, size in encoding():
+		print("Encoding 1920x1080, {} {}: {:.0f} ms, {} bytes".format(format, preset, seconds*1000, size))
+	with tempfile.TemporaryDirectory() as folder:
+		result = search(os.path.join(folder, "screenshots.db"))
+	print("Search in {} screenshots, full text {}: {:.2f} ms per search".format(result["entries"], result["fullText"], result["averageTime"]*1000))
@@ -0,0 +1,18 @@
+# -*- coding: UTF-8 -*-
+"""
+The modules of the addon are imported as the screenshot package without running its __init__, which registers the plugin in NVDA.
+Only the modules that work outside NVDA can be tested this way.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+import os
+import sys
+import types
+
+addonPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "screenshot")
+if "screenshot" not in sys.modules:
+	package = types.ModuleType("screenshot")
+	package.__path__ = [os.path.normpath(addonPath)]
+	sys.modules["screenshot"] = package
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""
+Startup benchmark of the screenshots wizard NVDA addon.
+Imports the addon and creates its GlobalPlugin as NVDA does at startup, with stand-ins for the modules of NVDA and wxPython,
+and reports the time spent and the modules of the addon that were loaded, which should be only those needed to register the plugin.
+It is run outside NVDA, with any Python 3: python tests/startupBenchmark.py
+It is not part of the addon package, since it replaces modules in sys.modules.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from statistics import median
+from time import perf_counter
+import builtins
+import importlib
+import os
+import sys
+import tempfile
+import types
+
+# Modules of NVDA, and wx, that the addon imports. All of them are replaced by stand-ins.
+nvdaModules = ("addonHandler", "api", "braille", "config", "contentRecog", "controlTypes", "globalCommands", "globalPluginHandler",
+"globalVars", "gui", "gui.settingsDialogs", "inputCore", "keyboardHandler", "locationHelper", "logHandler", "mouseHandler",
+"screenBitmap", "scriptHandler", "tones", "ui", "vision", "winInputHook", "winUser", "wx")
+# Modules of the addon that are expected to be loaded only when they are first used.
+lazyModules = ("burst", "encoders", "objectIndex", "ocr", "searchIndex", "writer")
+# Modules outside the addon that it should not load at startup.
+heavyModules = ("contentRecog", "sqlite3", "subprocess", "screenBitmap")
+
+class StandInMeta(type):
+
+	def __getattr__(cls, name):
+		return StandIn()
+
+class StandIn(metaclass=StandInMeta):
+	""" Accepts any use: calls, attributes, items, iteration... and gives other stand-ins or empty values. """
+
+	def __init__(self, *args, **kwargs):
+		pass
+
+	def __call__(self, *args, **kwargs):
+		return StandIn()
+
+	def __getattr__(self, name):
+		if name.startswith("__"): raise AttributeError(name)
+		return StandIn()
+
+	def __getitem__(self, key):
+		return StandIn()
+
+	def __setitem__(self, key, value):
+		pass
+
+	def __iter__(self):
+		return iter(())
+
+	def __contains__(self, item):
+		return False
+
+class StandInModule(types.ModuleType):
+	""" Module whose attributes are stand-ins, classes if their name is capitalized so that the addon can subclass them. """
+
+	def __getattr__(self, name):
+		if name.startswith("__"): raise AttributeError(name)
+		value = StandInMeta(name, (StandIn, ), {}) if name[:1].isupper() else StandIn()
+		setattr(self, name, value)
+		return value
+
+class Section(dict):
+	""" Configuration section that, like configobj, creates subsections on demand. """
+
+	def __missing__(self, key):
+		self[key] = Section()
+		return self[key]
+
+class ExtensionPoint():
+
+	def __init__(self):
+		self.handlers = []
+
+	def register(self, handler):
+		self.handlers.append(handler)
+
+	def unregister(self, handler):
+		if handler in self.handlers: self.handlers.remove(handler)
+
+def installStandIns(configPath):
+	""" Puts the stand-ins in sys.modules, with the few values that the addon reads at startup. """
+	for name in nvdaModules:
+		sys.modules[name] = StandInModule(name)
+	sys.modules["gui"].settingsDialogs = sys.modules["gui.settingsDialogs"]
+	sys.modules["gui"].NVDASettingsDialog.categoryClasses = []
+	config = sys.modules["config"]
+	config.conf = Section(braille=Section(showMessages=1))
+	config.conf.spec = {}
+	config.conf.profiles = [Section(screenshots=Section(folder=configPath))]
+	for name in ("post_configSave", "post_configReset", "post_configProfileSwitch"):
+		setattr(config, name, ExtensionPoint())
+	globalVars = sys.modules["globalVars"]
+	globalVars.appArgs = types.SimpleNamespace(secure=False, configPath=configPath)
+	# addonHandler.initTranslation installs _ in NVDA.
+	builtins._ = lambda text: text
+
+def removeAddon(package):
+	for name in list(sys.modules):
+		if name == package or name.startswith(package+"."):
+			del sys.modules[name]
+
+def benchmark(runs=10):
+	""" Imports the addon and creates and terminates its plugin runs times.
+	Returns a dictionary with the median seconds of the import and of the creation of the plugin,
+	and the names of the lazy modules of the addon and of the heavy modules that were loaded, which should be none. """
+	folder = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins", "screenshot"))
+	package = os.path.basename(folder)
+	sys.path.insert(0, os.path.dirname(folder))
+	importTimes, initTimes = [], []
+	loaded = set()
+	with tempfile.TemporaryDirectory() as configPath:
+		try:
+			for run in range(runs):
+				installStandIns(configPath)
+				removeAddon(package)
+				for name in heavyModules:
+					if name not in nvdaModules: sys.modules.pop(name, None)
+				start = perf_counter()
+				addon = importlib.import_module(package)
+				importTimes.append(perf_counter()-start)
+				start = perf_counter()
+				plugin = addon.GlobalPlugin()
+				initTimes.append(perf_counter()-start)
+				loaded.update(name for name in lazyModules if package+"."+name in sys.modules)
+				loaded.update(name for name in heavyModules if name not in nvdaModules and name in sys.modules)
+				# contentRecog is a stand-in, it has been used if the addon has read any of its attributes.
+				if set(vars(sys.modules["contentRecog"]))-set(vars(types.ModuleType("contentRecog"))):
+					loaded.add("contentRecog")
+				plugin.terminate()
+		finally:
+			removeAddon(package)
+			for name in nvdaModules:
+				sys.modules.pop(name, None)
+			sys.path.remove(os.path.dirname(folder))
+	return {"import": median(importTimes), "init": median(initTimes), "loadedAtStartup": sorted(loaded)}
+
+if __name__ == "__main__":
+	results = benchmark()
+	print("Import: {:.2f} ms".format(results["import"]*1000))
+	print("GlobalPlugin(): {:.2f} ms".format(results["init"]*1000))
+	print("Loaded at startup and not needed: {}".format(", ".join(results["loadedAtStartup"]) or "none"))
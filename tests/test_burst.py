@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+"""
+Burst of screenshots of a Rectangle driven by a SyntheticBackend, with a fake writer and a fake wx.CallLater.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.burst import Burst
+from screenshot.captureBackends import SyntheticBackend
+from screenshot.rectangleHandler import Rectangle
+from test_rectangleHandler import FakeObject
+from time import sleep
+import unittest
+
+class FakeWriter():
+	""" Accepts up to capacity jobs, which are written when write is called. """
+
+	def __init__(self, capacity=100):
+		self.capacity = capacity
+		self.jobs = []
+
+	def submit(self, job, timeout=0):
+		if len(self.jobs) >= self.capacity: return False
+		self.jobs.append(job)
+		return True
+
+	def write(self, done=True):
+		jobs, self.jobs = self.jobs, []
+		for job in jobs:
+			job.onDone(job, done)
+		return jobs
+
+class FakeCallLater():
+	""" Keeps the scheduled calls, which are run by runAll. wait is the time that passes before each call. """
+
+	def __init__(self, wait=0):
+		self.wait = wait
+		self.calls = []
+
+	def __call__(self, milliseconds, func):
+		self.calls.append(func)
+
+	def runAll(self):
+		while self.calls:
+			sleep(self.wait)
+			self.calls.pop(0)()
+
+class BurstTest(unittest.TestCase):
+
+	def setUp(self):
+		self.previousBackend = Rectangle.__dict__["backend"]
+		self.backend = SyntheticBackend(200, 100)
+		self.backend.fill(0, 0, 200, 100, (1, 2, 3, 255))
+		Rectangle.backend = self.backend
+		self.rectangle = Rectangle().fromObject(FakeObject(10, 20, 30, 40))
+		self.finished = []
+
+	def tearDown(self):
+		Rectangle.backend = self.previousBackend
+
+	def makeBurst(self, count, interval=0, writer=None, callLater=None):
+		return Burst(self.rectangle, count, interval, writer or FakeWriter(), lambda number: "shot{}.png".format(number),
+		onFinish=self.finished.append, callLater=callLater or FakeCallLater())
+
+	def test_framesAreCopiesOfTheSessionBuffer(self):
+		writer = FakeWriter()
+		callLater = FakeCallLater()
+		burst = self.makeBurst(2, writer=writer, callLater=callLater)
+		burst.start()
+		self.backend.fill(0, 0, 200, 100, (4, 5, 6, 255))
+		callLater.runAll()
+		jobs = writer.write()
+		self.assertEqual([job.path for job in jobs], ["shot1.png", "shot2.png"])
+		self.assertEqual(bytes(jobs[0].image.buffer), bytes((1, 2, 3, 255))*(30*40))
+		self.assertEqual(bytes(jobs[1].image.buffer), bytes((4, 5, 6, 255))*(30*40))
+		self.assertEqual(self.backend.allocations, 1)
+
+	def test_fullWriterDropsFrames(self):
+		writer = FakeWriter(capacity=3)
+		callLater = FakeCallLater()
+		burst = self.makeBurst(5, writer=writer, callLater=callLater)
+		burst.start()
+		callLater.runAll()
+		self.assertEqual((burst.captured, burst.dropped), (3, 2))
+		self.assertFalse(burst.running)
+		self.assertGreater(burst.fps, 0)
+		self.assertEqual(self.finished, [])
+		writer.write()
+		self.assertEqual(self.finished, [burst])
+		self.assertEqual((burst.written, burst.failed, burst.lastPath), (3, 0, "shot3.png"))
+
+	def test_lateFramesAreDropped(self):
+		writer = FakeWriter()
+		# Each frame is taken two intervals after the previous one.
+		callLater = FakeCallLater(wait=0.04)
+		burst = self.makeBurst(6, interval=0.02, writer=writer, callLater=callLater)
+		burst.start()
+		callLater.runAll()
+		self.assertEqual(burst.taken, 6)
+		self.assertGreater(burst.dropped, 0)
+		self.assertEqual(burst.captured, len(writer.jobs))
+		writer.write(done=False)
+		self.assertEqual(burst.failed, burst.captured)
+		self.assertEqual(self.finished, [burst])
+
+	def test_stopDropsTheRemainingFrames(self):
+		writer = FakeWriter()
+		burst = self.makeBurst(10, writer=writer)
+		burst.start()
+		burst.stop()
+		self.assertEqual((burst.captured, burst.dropped), (1, 9))
+		writer.write()
+		self.assertEqual(self.finished, [burst])
+
+if __name__ == "__main__":
+	unittest.main()
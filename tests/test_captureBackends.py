@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+"""
+Capture backends that work without a Windows desktop, and the suppressor of the mouse pointer.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.captureBackends import CursorSuppressor, SyntheticBackend
+from screenshot.geometry import RectLTWH
+from time import sleep
+import unittest
+
+class CursorSuppressorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.restores = 0
+		self.suppressor = CursorSuppressor(lambda: None, self.restore, delay=0.05)
+
+	def restore(self):
+		self.restores += 1
+
+	def captures(self, count, interval):
+		for i in range(count):
+			with self.suppressor:
+				pass
+			sleep(interval)
+
+	def test_closeCapturesHideThePointerOnce(self):
+		self.captures(5, 0.005)
+		self.assertEqual(self.suppressor.hides, 1)
+		sleep(0.2)
+		self.assertFalse(self.suppressor.hidden)
+		self.assertEqual(self.restores, 1)
+
+	def test_pointerIsRestoredBetweenDistantCaptures(self):
+		# As the polls of watch mode when their interval is longer than the delay.
+		self.captures(3, 0.2)
+		self.assertEqual(self.suppressor.hides, 3)
+		self.assertEqual(self.restores, 3)
+		self.assertFalse(self.suppressor.hidden)
+
+	def test_heldPointerIsNotRestored(self):
+		self.suppressor.acquire()
+		sleep(0.1)
+		self.suppressor.restoreNow()
+		self.assertTrue(self.suppressor.hidden)
+		self.suppressor.release()
+		self.suppressor.restoreNow()
+		sleep(0.05)
+		self.assertFalse(self.suppressor.hidden)
+
+class SyntheticBackendTest(unittest.TestCase):
+
+	def test_heldFrame(self):
+		backend = SyntheticBackend(8, 8)
+		backend.fill(0, 0, 8, 8, (1, 1, 1, 1))
+		frame = backend.hold(RectLTWH(2, 2, 4, 4))
+		backend.fill(0, 0, 8, 8, (2, 2, 2, 2))
+		self.assertEqual(bytes(frame.grab(RectLTWH(2, 3, 4, 2))), bytes((1, 1, 1, 1))*8)
+		with self.assertRaises(ValueError):
+			frame.grab(RectLTWH(0, 0, 4, 4))
+
+if __name__ == "__main__":
+	unittest.main()
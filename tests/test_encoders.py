@@ -0,0 +1,61 @@
+# -*- coding: UTF-8 -*-
+"""
+Streaming encoders of large screenshots, with a SyntheticBackend.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.captureBackends import SyntheticBackend
+from screenshot.encoders import TiledCapture
+from screenshot.geometry import RectLTWH
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+def readPNG(path):
+	""" Returns (width, height, rgb) of a PNG written by PNGWriter, whose rows have no filter. """
+	with open(path, "rb") as f:
+		data = f.read()
+	pos, idat = 8, b""
+	while pos < len(data):
+		length, kind = struct.unpack(">I4s", data[pos:pos+8])
+		chunk = data[pos+8:pos+8+length]
+		if kind == b"IHDR": width, height = struct.unpack(">II", chunk[:8])
+		if kind == b"IDAT": idat += chunk
+		pos += length+12
+	raw = zlib.decompress(idat)
+	rowSize = width*3+1
+	return width, height, b"".join(raw[row*rowSize+1:(row+1)*rowSize] for row in range(height))
+
+class TiledCaptureTest(unittest.TestCase):
+
+	def setUp(self):
+		self.backend = SyntheticBackend(64, 40)
+		self.backend.fill(0, 0, 64, 40, (30, 20, 10, 255))
+		self.folder = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.folder.cleanup()
+
+	def test_savesThePixelsOfTheMomentItWasTaken(self):
+		location = RectLTWH(4, 2, 50, 30)
+		image = TiledCapture(self.backend.hold(location), location, "PNG", stripRows=8)
+		# What happens on the screen after the key press must not be in the file.
+		self.backend.fill(0, 0, 64, 40, (0, 0, 255, 255))
+		path = os.path.join(self.folder.name, "shot.png")
+		self.assertTrue(image.SaveFile(path))
+		self.assertEqual(readPNG(path), (50, 30, bytes((10, 20, 30))*(50*30)))
+		self.assertIsNone(image.frame)
+
+	def test_closeReleasesTheFrame(self):
+		location = RectLTWH(0, 0, 64, 40)
+		frame = self.backend.hold(location)
+		image = TiledCapture(frame, location, "TIFF")
+		image.close()
+		self.assertIsNone(frame.buffer)
+
+if __name__ == "__main__":
+	unittest.main()
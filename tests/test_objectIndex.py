@@ -0,0 +1,87 @@
+# -*- coding: UTF-8 -*-
+"""
+ObjectIndex built from a tree of fake objects.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.geometry import RectLTWH
+from screenshot.objectIndex import ObjectIndex
+import unittest
+
+class FakeObject():
+
+	def __init__(self, left, top, width, height, parent=None):
+		self.location = RectLTWH(left, top, width, height)
+		self.parent = parent
+		self.children = []
+		if parent: parent.children.append(self)
+
+class ObjectIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.window = FakeObject(0, 0, 400, 300)
+		self.pane = FakeObject(0, 0, 200, 300, self.window)
+		self.button = FakeObject(10, 10, 50, 20, self.pane)
+
+	def test_deepestObject(self):
+		index = ObjectIndex()
+		index.build(self.window)
+		self.assertTrue(index.complete)
+		self.assertIs(index.objectAt(20, 20), self.button)
+		self.assertIs(index.objectAt(100, 100), self.pane)
+		self.assertIs(index.objectAt(300, 100), self.window)
+
+	def test_incompleteBuild(self):
+		index = ObjectIndex(maxObjects=2)
+		index.build(self.window)
+		self.assertTrue(index.ready)
+		self.assertFalse(index.complete)
+
+	def test_failedChildrenMakeItIncomplete(self):
+		class Unreachable(FakeObject):
+			@property
+			def children(self):
+				raise RuntimeError("The object has disappeared")
+			@children.setter
+			def children(self, children):
+				pass
+		window = Unreachable(0, 0, 400, 300)
+		index = ObjectIndex()
+		index.build(window)
+		self.assertTrue(index.ready)
+		self.assertFalse(index.complete)
+		self.assertIs(index.objectAt(20, 20), window)
+
+	def test_cancelledBuild(self):
+		index = ObjectIndex()
+		index.cancel()
+		index.build(self.window)
+		self.assertTrue(index.ready)
+		self.assertFalse(index.complete)
+		self.assertLessEqual(len(index), 1)
+
+	def test_updateUnknownObjects(self):
+		index = ObjectIndex()
+		index.build(self.window)
+		# An object of another window is not indexed.
+		other = FakeObject(0, 0, 400, 300, FakeObject(0, 0, 800, 600))
+		index.update(other)
+		self.assertIs(index.objectAt(20, 20), self.button)
+		# A new child of an indexed object is indexed below it, clipped by it.
+		item = FakeObject(150, 100, 100, 20, self.pane)
+		index.update(item)
+		self.assertIs(index.objectAt(160, 110), item)
+		self.assertIs(index.objectAt(220, 110), self.window)
+
+	def test_updateMovedObject(self):
+		index = ObjectIndex()
+		index.build(self.window)
+		self.button.location = RectLTWH(100, 100, 50, 20)
+		index.update(self.button)
+		self.assertIs(index.objectAt(20, 20), self.pane)
+		self.assertIs(index.objectAt(110, 110), self.button)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+"""
+OCR service and tiled recognizer with a fake engine that behaves as contentRecog.uwpOcr.UwpOcr.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.ocr import OCRService, TiledRecognizer
+from threading import Lock, Thread
+from time import sleep
+import types
+import unittest
+
+class FakeUwpOcr():
+	""" Same life cycle as UwpOcr.recognize: the dll answers from its own thread through the callback,
+	then the callback terminates self._handle and forgets self._callback. A recognition whose handle has been terminated,
+	or whose callback has been forgotten, is never answered. """
+
+	def __init__(self, delay=0.005):
+		self.delay = delay
+		self.recognitions = 0
+		self.answered = 0
+		self.threads = []
+		self._handle = None
+		self._callback = None
+		self._onResult = None
+		self.__running = set()
+		self.__lock = Lock()
+
+	def getResizeFactor(self, width, height):
+		return 1
+
+	def recognize(self, pixels, imgInfo, onResult):
+		self._onResult = onResult
+		def callback(result):
+			if self._onResult: self._onResult(result)
+			# uwpOcr_terminate(self._handle)
+			self.__running.discard(self._handle)
+			self._callback = None
+			self._handle = None
+		with self.__lock:
+			self.recognitions += 1
+			handle = self.recognitions
+		self._callback = callback
+		self._handle = handle
+		self.__running.add(handle)
+		result = types.SimpleNamespace(data=[[{"text": "tile{}".format(bytes(pixels[:1])[0] if len(pixels) else 0),
+		"x": 0, "y": 0, "width": 10, "height": 10}]])
+		thread = Thread(target=self.__answer, args=(handle, callback, result), daemon=True)
+		self.threads.append(thread)
+		thread.start()
+
+	def __answer(self, handle, callback, result):
+		sleep(self.delay)
+		if handle in self.__running and self._callback is callback:
+			self.answered += 1
+			callback(result)
+
+	def idle(self):
+		return all(not thread.is_alive() for thread in self.threads)
+
+class MainLoop():
+	""" Runs the scheduled functions after the threads of the engines have finished, as wx.CallAfter runs them in the main thread. """
+
+	def __init__(self, engines):
+		self.engines = engines
+		self.pending = []
+
+	def schedule(self, func, *args):
+		self.pending.append((func, args))
+
+	def run(self, done, timeout=2.0):
+		for i in range(int(timeout/0.005)):
+			if all(engine.idle() for engine in self.engines):
+				if done(): return True
+				while self.pending:
+					func, args = self.pending.pop(0)
+					func(*args)
+			sleep(0.005)
+		return done()
+
+class OCRServiceTest(unittest.TestCase):
+
+	def test_everyRequestIsAnswered(self):
+		engine = FakeUwpOcr()
+		loop = MainLoop([engine])
+		service = OCRService(engine, supersede=False, schedule=loop.schedule)
+		results = []
+		for i in range(3):
+			service.recognize(bytearray([i])*16, None, (0, 0, 2, 2), results.append)
+		self.assertTrue(loop.run(lambda: len(results) == 3))
+		self.assertEqual(engine.recognitions, 3)
+		self.assertEqual(engine.answered, 3)
+		self.assertFalse(service.busy)
+
+	def test_oldestWaitingRequestIsDropped(self):
+		engine = FakeUwpOcr()
+		loop = MainLoop([engine])
+		service = OCRService(engine, supersede=False, schedule=loop.schedule, maxPending=2)
+		results = []
+		for i in range(5):
+			service.recognize(bytearray([i])*16, None, (0, 0, 2, 2), lambda result, i=i: results.append((i, result)))
+		# The first one is being recognized, the second and third ones have been dropped for the last two.
+		self.assertEqual(results, [(1, None), (2, None)])
+		self.assertLessEqual(service.pending, 2)
+		self.assertTrue(loop.run(lambda: len(results) == 5))
+		self.assertEqual([i for i, result in results[2:]], [0, 3, 4])
+		self.assertEqual((engine.recognitions, service.dropped), (3, 2))
+
+	def test_waitingRequestReplacesTheCurrentOne(self):
+		engine = FakeUwpOcr()
+		loop = MainLoop([engine])
+		service = OCRService(engine, schedule=loop.schedule)
+		results = []
+		for i in range(3):
+			service.recognize(bytearray([i])*16, None, (0, 0, 2, 2), results.append)
+		self.assertTrue(loop.run(lambda: len(results) == 1 and not service.busy))
+		self.assertEqual(engine.recognitions, 2)
+		self.assertEqual(results[0].data[0][0]["text"], "tile2")
+
+	def test_cachedResult(self):
+		engine = FakeUwpOcr()
+		loop = MainLoop([engine])
+		service = OCRService(engine, schedule=loop.schedule)
+		results = []
+		service.recognize(bytearray(16), None, (0, 0, 2, 2), results.append)
+		self.assertTrue(loop.run(lambda: len(results) == 1))
+		service.recognize(bytearray(16), None, (0, 0, 2, 2), results.append)
+		self.assertEqual(len(results), 2)
+		self.assertEqual(engine.recognitions, 1)
+
+class TiledRecognizerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.engines = []
+		self.loop = MainLoop(self.engines)
+
+	def makeEngine(self):
+		engine = FakeUwpOcr()
+		self.engines.append(engine)
+		return engine
+
+	def makeRecognizer(self, **kwargs):
+		return TiledRecognizer(self.makeEngine, 2,
+		makeImageInfo=lambda left, top, width, height: types.SimpleNamespace(screenLeft=left, screenTop=top, screenWidth=width, screenHeight=height, resizeFactor=1),
+		makeResult=lambda data, imgInfo: types.SimpleNamespace(data=data),
+		schedule=self.loop.schedule, **kwargs)
+
+	def test_moreTilesThanEngines(self):
+		recognizer = self.makeRecognizer(tileSize=100, overlap=8)
+		width, height = 300, 200
+		imgInfo = types.SimpleNamespace(screenLeft=0, screenTop=0, screenWidth=width, screenHeight=height, resizeFactor=1)
+		results = []
+		recognizer.recognize(bytearray(width*height*4), imgInfo, results.append)
+		self.assertTrue(self.loop.run(lambda: len(results) == 1))
+		# 4 columns by 3 rows, each tile answered by its own engine, two at a time.
+		tiles = len(recognizer.lastTimings)
+		self.assertEqual(tiles, 12)
+		self.assertEqual(sum(engine.answered for engine in self.engines), tiles)
+		self.assertEqual(sum(len(line) for line in results[0].data), tiles)
+
+	def test_smallImage(self):
+		recognizer = self.makeRecognizer()
+		imgInfo = types.SimpleNamespace(screenLeft=0, screenTop=0, screenWidth=4, screenHeight=4, resizeFactor=1)
+		results = []
+		recognizer.recognize(bytearray(4*4*4), imgInfo, results.append)
+		self.assertTrue(self.loop.run(lambda: len(results) == 1))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,176 @@
+# -*- coding: UTF-8 -*-
+"""
+Rectangle driven by a SyntheticBackend, without NVDA nor a Windows desktop.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.captureBackends import SyntheticBackend
+from screenshot.geometry import RectLTWH
+from screenshot.rectangleHandler import ClipCache, EVT_objectInside, EVT_objectOverflow, EVT_pixelsChanged, Rectangle, StateWorker, clipCache
+from time import sleep
+import gc
+import unittest
+import weakref
+
+class FakeObject():
+
+	def __init__(self, left, top, width, height, container=None):
+		self.location = RectLTWH(left, top, width, height)
+		self.container = container
+
+class CountingObject(FakeObject):
+	""" Counts the lookups of its container, which are cross-process calls in NVDA. """
+
+	lookups = 0
+
+	@property
+	def container(self):
+		CountingObject.lookups += 1
+		return self.__container
+
+	@container.setter
+	def container(self, container):
+		self.__container = container
+
+class RectangleTest(unittest.TestCase):
+
+	def setUp(self):
+		self.previousBackend = Rectangle.__dict__["backend"]
+		self.backend = SyntheticBackend(200, 100)
+		self.backend.fill(10, 20, 30, 40, (1, 2, 3, 255))
+		Rectangle.backend = self.backend
+
+	def tearDown(self):
+		Rectangle.backend = self.previousBackend
+
+	def test_capture(self):
+		rectangle = Rectangle().fromObject(FakeObject(10, 20, 30, 40))
+		count = Rectangle.captureCount
+		capture = rectangle.capture()
+		self.assertEqual(Rectangle.captureCount, count+1)
+		self.assertEqual(self.backend.captures, 1)
+		self.assertEqual((capture.width, capture.height), (30, 40))
+		self.assertEqual(bytes(capture.buffer), bytes((1, 2, 3, 255))*(30*40))
+
+	def test_captureOutsideTheScreen(self):
+		rectangle = Rectangle().fromObject(FakeObject(190, 90, 30, 40))
+		count = Rectangle.captureCount
+		self.assertIsNone(rectangle.capture())
+		self.assertEqual(Rectangle.captureCount, count+1)
+
+	def test_sessionReusesBuffers(self):
+		rectangle = Rectangle().fromObject(FakeObject(10, 20, 30, 40))
+		rectangle.openSession()
+		for i in range(3): rectangle.capture()
+		rectangle.closeSession()
+		self.assertEqual(self.backend.captures, 3)
+		self.assertEqual(self.backend.allocations, 1)
+
+	def test_edgesStayOnTheScreen(self):
+		window = FakeObject(0, 0, 200, 100)
+		rectangle = Rectangle().fromObject(FakeObject(10, 20, 30, 40, window))
+		self.assertEqual(rectangle.moveRightEdge(160), 200)
+		self.assertIsNone(rectangle.moveRightEdge(1))
+		self.assertIsNone(rectangle.moveTopEdge(-21))
+		self.assertEqual(rectangle.location, RectLTWH(10, 20, 190, 40))
+		self.assertTrue(rectangle.isRectangleInsideTheWindow())
+
+	def test_unbindReleasesTheRectangle(self):
+		rectangle = Rectangle().fromObject(FakeObject(10, 20, 30, 40))
+		rectangle.bind(EVT_pixelsChanged, lambda rectangle: None, rectangle)
+		reference = weakref.ref(rectangle)
+		rectangle.unbind()
+		del rectangle
+		for i in range(50):
+			gc.collect()
+			if reference() is None: break
+			sleep(0.02)
+		self.assertIsNone(reference())
+
+class StateWorkerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.previousBackend = Rectangle.__dict__["backend"]
+		Rectangle.backend = SyntheticBackend(200, 100)
+		clipCache.invalidate()
+		self.rectangle = Rectangle().fromObject(FakeObject(20, 20, 40, 30))
+		self.events = []
+		for event in (EVT_objectInside, EVT_objectOverflow):
+			self.rectangle.bind(event, self.events.append, event)
+
+	def tearDown(self):
+		self.rectangle.unbind()
+		Rectangle.backend = self.previousBackend
+
+	def settle(self):
+		sleep(StateWorker.settleTime*4)
+		events, self.events[:] = self.events[:], []
+		return events
+
+	def test_eventsOfTheMoves(self):
+		self.rectangle.moveRightEdge(-5)
+		self.rectangle.moveRightEdge(-5)
+		self.assertEqual(self.settle(), [EVT_objectOverflow])
+		self.rectangle.moveRightEdge(10)
+		self.assertEqual(self.settle(), [EVT_objectInside])
+		# Moves that come back to the same state before settling are not notified.
+		self.rectangle.moveRightEdge(-10)
+		self.rectangle.moveRightEdge(10)
+		self.assertEqual(self.settle(), [])
+
+	def test_adjustingToTheObjectIsTheStateBeforeTheNextMove(self):
+		self.rectangle.moveRightEdge(-10)
+		self.assertEqual(self.settle(), [EVT_objectOverflow])
+		self.rectangle.adjustToObject()
+		self.rectangle.expandOrShrink(5)
+		self.assertEqual(self.settle(), [])
+
+	def test_refusedMove(self):
+		self.rectangle.moveRightEdge(-10)
+		self.assertEqual(self.settle(), [EVT_objectOverflow])
+		self.assertIsNone(self.rectangle.moveRightEdge(-100))
+		self.assertEqual(self.settle(), [])
+		self.rectangle.adjustToObject()
+		self.rectangle.moveRightEdge(5)
+		self.assertEqual(self.settle(), [])
+
+class ClipCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.cache = ClipCache(ttl=0.05, maxSize=2)
+		self.objects = [FakeObject(0, 0, 1, 1) for i in range(3)]
+
+	def test_entriesExpire(self):
+		self.cache.put(self.objects[0], RectLTWH(0, 0, 1, 1), 3)
+		self.assertEqual(self.cache.get(self.objects[0]), RectLTWH(0, 0, 1, 1))
+		self.assertEqual((self.cache.hits, self.cache.lookupsSaved), (1, 3))
+		sleep(0.1)
+		self.assertIsNone(self.cache.get(self.objects[0]))
+		self.assertEqual((self.cache.misses, self.cache.lookupsSaved), (1, 3))
+
+	def test_leastRecentlyUsedIsDiscarded(self):
+		for obj in self.objects[:2]: self.cache.put(obj, obj.location, 1)
+		self.cache.get(self.objects[0])
+		self.cache.put(self.objects[2], self.objects[2].location, 1)
+		self.assertIsNone(self.cache.get(self.objects[1]))
+		self.assertIsNotNone(self.cache.get(self.objects[0]))
+		self.cache.invalidate()
+		self.assertIsNone(self.cache.get(self.objects[0]))
+
+	def test_rectangleSavesTheContainerLookups(self):
+		clipCache.invalidate()
+		window = CountingObject(0, 0, 100, 50)
+		panel = CountingObject(10, 10, 100, 100, window)
+		button = CountingObject(20, 40, 30, 30, panel)
+		rectangle = Rectangle().fromObject(button)
+		lookups, saved = CountingObject.lookups, clipCache.lookupsSaved
+		self.assertEqual(rectangle.location, RectLTWH(20, 40, 30, 10))
+		self.assertTrue(rectangle.isObjectInsideRectangle(button))
+		self.assertEqual(rectangle.ratioObjectFrame(button), 1)
+		self.assertEqual(CountingObject.lookups, lookups)
+		self.assertEqual(clipCache.lookupsSaved, saved+6)
+
+if __name__ == "__main__":
+	unittest.main()
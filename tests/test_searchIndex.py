@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+"""
+Index of the saved screenshots.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.searchIndex import ScreenshotIndex, contentKey
+import os
+import tempfile
+import unittest
+
+class ScreenshotIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		self.index = ScreenshotIndex(os.path.join(self.folder.name, "screenshots.db"))
+
+	def tearDown(self):
+		self.index.close()
+		self.folder.cleanup()
+
+	def write(self, name, data):
+		path = os.path.join(self.folder.name, name)
+		with open(path, "wb") as f:
+			f.write(data)
+		return path
+
+	def test_search(self):
+		self.index.add(self.write("a.png", b"a"), (0, 0, 10, 10), "button", "OK", "Save the document")
+		self.index.add(self.write("b.png", b"b"), (0, 0, 10, 10), "window", "Editor", "Nothing here")
+		self.assertEqual([row[0] for row in self.index.search("docu")], [os.path.join(self.folder.name, "a.png")])
+		self.assertEqual(len(self.index.search("editor")), 1)
+
+	def test_findContent(self):
+		key = contentKey(bytearray(16), 2, 2, "PNG")
+		path = self.write("a.png", b"image")
+		self.index.addContent(key, path)
+		self.assertEqual(self.index.findContent(key), path)
+		os.remove(path)
+		self.assertIsNone(self.index.findContent(key))
+
+	def test_overwrittenFileIsNotADuplicate(self):
+		key = contentKey(bytearray(16), 2, 2, "PNG")
+		path = self.write("a.png", b"image")
+		self.index.addContent(key, path)
+		# The same name saved again with other content, for example two screenshots in the same second.
+		self.write("a.png", b"another image")
+		self.assertIsNone(self.index.findContent(key))
+
+	def test_newContentOfAPathReplacesTheOldKey(self):
+		old, new = contentKey(bytearray(16), 2, 2, "PNG"), contentKey(bytearray(b"x"*16), 2, 2, "PNG")
+		path = self.write("a.png", b"image")
+		self.index.addContent(old, path)
+		stat = os.stat(path)
+		self.write("a.png", b"other")
+		# Same size and time as the old file, only the new key can find it.
+		os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+		self.index.addContent(new, path)
+		self.assertIsNone(self.index.findContent(old))
+		self.assertEqual(self.index.findContent(new), path)
+
+if __name__ == "__main__":
+	unittest.main()
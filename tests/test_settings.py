@@ -0,0 +1,36 @@
+# -*- coding: UTF-8 -*-
+"""
+Typed settings read from configuration sections.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.settings import Settings, confspec
+import unittest
+
+class SettingsTest(unittest.TestCase):
+
+	def test_typedValues(self):
+		settings = Settings(confspec)
+		settings.load({"step": "3", "scale": "True", "format": "JPG"})
+		self.assertEqual((settings.step, settings.scale, settings.format), (3, True, "JPG"))
+
+	def test_invalidValuesTakeTheDefault(self):
+		settings = Settings(confspec)
+		# A format that cannot be chosen in the panel, for example one written by hand in nvda.ini.
+		settings.load({"step": "99", "jpegQuality": "high", "format": "XCF"})
+		self.assertEqual((settings.step, settings.jpegQuality, settings.format), (10, 90, "PNG"))
+
+	def test_setWritesTheSection(self):
+		settings = Settings(confspec)
+		section = {}
+		changes = []
+		settings.register(changes.append)
+		settings.set("burstCount", "1", section)
+		self.assertEqual(section, {"burstCount": 2})
+		self.assertEqual(settings.burstCount, 2)
+		self.assertEqual(len(changes), 1)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+"""
+Change detection of watch mode, with a SyntheticBackend.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.captureBackends import SyntheticBackend
+from screenshot.geometry import RectLTWH
+from screenshot.watch import Watcher, blockHashes, changedBands
+from threading import Event
+import unittest
+
+class BlockHashesTest(unittest.TestCase):
+
+	def setUp(self):
+		self.backend = SyntheticBackend(20, 50)
+		self.location = RectLTWH(0, 0, 20, 50)
+
+	def test_oneChecksumPerBand(self):
+		hashes = blockHashes(self.backend.grab(self.location), 20, blockRows=16)
+		# The last band has only the 2 remaining rows.
+		self.assertEqual(len(hashes), 4)
+		self.assertEqual(hashes, blockHashes(self.backend.grab(self.location), 20, blockRows=16))
+
+	def test_onlyTheChangedBandsDiffer(self):
+		previous = blockHashes(self.backend.grab(self.location), 20, blockRows=10)
+		self.backend.fill(3, 12, 2, 1, (255, 0, 0, 255))
+		self.backend.fill(3, 45, 2, 1, (255, 0, 0, 255))
+		current = blockHashes(self.backend.grab(self.location), 20, blockRows=10)
+		self.assertEqual(changedBands(previous, current), [1, 4])
+		self.assertEqual(changedBands(current, current), [])
+
+	def test_differentSizesChangeEverything(self):
+		self.assertEqual(changedBands([1, 2], [1, 2, 3]), [0, 1, 2])
+
+class WatcherTest(unittest.TestCase):
+
+	def test_changeIsSignaledWithItsRows(self):
+		backend = SyntheticBackend(20, 50)
+		event = Event()
+		watcher = Watcher(backend, RectLTWH(0, 0, 20, 50), 0.01, event, blockRows=10)
+		watcher.start()
+		try:
+			while watcher.polls < 2: event.wait(0.01)
+			self.assertFalse(event.is_set())
+			backend.fill(0, 22, 20, 1, (1, 1, 1, 1))
+			self.assertTrue(event.wait(5))
+		finally:
+			watcher.stop()
+			watcher.join(5)
+		self.assertEqual(watcher.changes, 1)
+		self.assertEqual(watcher.changedRows, (20, 30))
+		self.assertEqual(bytes(watcher.frame[22*20*4:23*20*4]), bytes((1, 1, 1, 1))*20)
+
+if __name__ == "__main__":
+	unittest.main()
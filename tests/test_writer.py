@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+"""
+Background writer of screenshots, with fake images and a fake filesystem.
+
+This file is covered by the GNU General Public License.
+Copyright (C) Javi Dominguez 2021
+"""
+
+from screenshot.writer import ImageWriter, SaveJob
+from threading import Event
+import unittest
+
+class FakeImage():
+
+	def __init__(self, name):
+		self.name = name
+		self.options = {}
+
+	def SetOption(self, name, value):
+		self.options[name] = value
+
+class FakeDisk():
+	""" Keeps the saved images by path. The writes can be held until released is set. """
+
+	def __init__(self, hold=False):
+		self.files = {}
+		self.released = Event()
+		self.saving = Event()
+		if not hold: self.released.set()
+
+	def save(self, image, path):
+		self.saving.set()
+		self.released.wait(5)
+		if path.startswith("readonly"): return False
+		if path.startswith("broken"): raise IOError("disk full")
+		self.files[path] = image
+		return True
+
+class ImageWriterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.disk = FakeDisk(hold=True)
+		self.results = []
+		self.writer = ImageWriter(maxPending=2, save=self.disk.save)
+		self.writer.start()
+
+	def tearDown(self):
+		self.disk.released.set()
+		self.writer.stop()
+		self.writer.join(5)
+
+	def onDone(self, job, done):
+		self.results.append((job.path, done))
+
+	def job(self, path, **kwargs):
+		return SaveJob(FakeImage(path), path, onDone=self.onDone, **kwargs)
+
+	def test_submitIsRefusedWhenTheQueueIsFull(self):
+		self.assertTrue(self.writer.submit(self.job("a")))
+		# The worker waits in the held disk with the first job, the next ones stay in the queue.
+		self.assertTrue(self.disk.saving.wait(5))
+		self.assertEqual([self.writer.submit(self.job(name)) for name in "bcd"], [True, True, False])
+		self.assertEqual(self.writer.pending, self.writer.maxPending)
+		self.disk.released.set()
+		self.writer.waitPending()
+		self.assertEqual(sorted(self.disk.files), ["a", "b", "c"])
+
+	def test_onDoneReportsWhetherTheFileWasWritten(self):
+		self.disk.released.set()
+		for path in ("ok.png", "readonly.png", "broken.png"):
+			self.writer.submit(self.job(path), timeout=5)
+		self.writer.waitPending()
+		self.assertEqual(self.results, [("ok.png", True), ("readonly.png", False), ("broken.png", False)])
+		self.assertEqual(list(self.disk.files), ["ok.png"])
+
+	def test_transformAndOptionsAreAppliedBeforeSaving(self):
+		self.disk.released.set()
+		job = self.job("scaled.png", transform=lambda image: FakeImage(image.name+" x2"), options={"PngZL": 1})
+		self.writer.submit(job, timeout=5)
+		self.writer.waitPending()
+		self.assertEqual(self.disk.files["scaled.png"].name, "scaled.png x2")
+		self.assertEqual(self.disk.files["scaled.png"].options, {"PngZL": 1})
+		# The pixels are not kept once saved.
+		self.assertIsNone(job.image)
+
+	def test_stopDrainsTheQueue(self):
+		for path in ("1", "2"):
+			self.writer.submit(self.job(path))
+		self.writer.stop()
+		self.assertFalse(self.writer.submit(self.job("3")))
+		self.disk.released.set()
+		self.writer.join(5)
+		self.assertFalse(self.writer.is_alive())
+		self.assertEqual(sorted(self.disk.files), ["1", "2"])
+
+	def test_dispatchRunsTheCallbacks(self):
+		self.writer.stop()
+		dispatched = []
+		writer = ImageWriter(save=self.disk.save, dispatch=lambda func, *args: dispatched.append((func, args)))
+		writer.start()
+		self.disk.released.set()
+		writer.submit(self.job("a"), timeout=5)
+		writer.stop()
+		writer.join(5)
+		self.assertEqual(len(dispatched), 1)
+		self.assertEqual(self.results, [])
+		func, args = dispatched[0]
+		func(*args)
+		self.assertEqual(self.results, [("a", True)])
+
+if __name__ == "__main__":
+	unittest.main()